@@ -476,8 +476,13 @@ def extractName(eac):
 		return part.text
 
 def main():
+	parser = ArgumentParser()
+	msg = "number of processes to parse the JSON with"
+	parser.add_argument("--processes", type=int, default=1, help=msg)
+	args = parser.parse_args()
+
 	# Load JSON constellation data from file
-	constellations = loadSnacData()
+	constellations = loadSnacData(processes=args.processes)
 
 	# Initialize container for finished eacs
 	eacs = []
@@ -8,11 +8,10 @@ Written by James Truitt of Swarthmore College's Friends Historical Library,
 November 2021
 """
 
-import requests, json, argparse, secret
-from utils import Relationship, loadRelationsFromFile, apiError
-from utils import postToApi, verifyApiSuccess
-from apiEditUtils import checkOutConstellation, publishConstellation
-from apiEditUtils import getUserInput, pushChangesToSnac
+import argparse
+from utils import loadRelationsFromFile
+from apiEditUtils import editConstellation, makeEdits, getApiUrl
+from apiEditUtils import getUserInput, getEditJournal
 
 def convertToJson(relation):
 	"""
@@ -75,6 +74,47 @@ def buildMinimalConstellation(snacID, version, ark, relationships):
 
 	return constellation
 
+def validateSourceId(snacID):
+	"""
+	Make sure a source ID is a positive int, printing an error if it isn't
+
+	@param: snacID, int or str, SNAC ID of the constellation to update
+	@return: the ID as an int, or None if it isn't valid
+	"""
+	if isinstance(snacID, str):
+		try:
+			snacID = int(snacID)
+		except ValueError:
+			snacID = None
+
+	if not isinstance(snacID, int) or snacID <= 1:
+		print("Error with the following Source ID:", snacID)
+		print("Source Constellation ID must be a positive integer")
+		print("No relations with this source could be added")
+		return None
+
+	return snacID
+
+def relationsBuilder(relationships):
+	"""
+	Return a function building the minimal constellation to add relationships
+
+	@param: relationships, list of Relationship objects
+	@return: a function taking a checked-out constellation (see
+		apiEditUtils.editConstellation)
+	"""
+	# Convert each relationship object into a dict representing SNAC JSON form
+	relationJsons = [convertToJson(relation) for relation in relationships]
+
+	def build(constellation):
+		# Use the checked-out constellation's ark, id, and version to build a
+		# minimal constellation JSON that includes the information we want to
+		# add, & the OPERATION attr (see walkthrough)
+		return buildMinimalConstellation(constellation["id"],
+			constellation["version"], constellation["ark"], relationJsons)
+
+	return build
+
 def insertRelations(snacID, apiKey, relationships, production = False):
 	"""
 	Add CPF relationships to a SNAC constellation by making several API calls.
@@ -90,103 +130,35 @@ def insertRelations(snacID, apiKey, relationships, production = False):
 	@param: relationships, list of Relationship objects
 	@param: production, bool, whether to use production or development server
 	"""
-	# print("in insertRelations")
-	##### Validate & process arguments #######
-
-	## Validate arguments ##
-
-	# Make sure SNAC ID is a positive int; raise error if unable to make it one
-	if isinstance(snacID, str):
-		try:
-			snacID = int(snacID)
-		except ValueError:
-			print("Error with the following Source ID:", snacID)
-			print("Source Constellation ID must be a positive integer")
-			print("No relations with this source could be added")
-			return None
-
-	if isinstance(snacID, int):
-		if snacID <= 1:
-			print("Error with the following Source ID:", snacID)
-			print("Source Constellation ID must be a positive integer")
-			print("No relations with this source could be added")
-			return None
-	else:
-		print("Error with the following Source ID:", snacID)
-		print("Source Constellation ID must be a positive integer")
-		print("No relations with this source could be added")
+	# Validate arguments
+	snacID = validateSourceId(snacID)
+	if snacID is None:
 		return None
 
-	# Validate API key
 	if not isinstance(apiKey, str):
 		raise Exception("Error: API key must be a string.")
 
-	# Set appropriate URL
-	if production == True:
-		baseUrl = "https://api.snaccooperative.org"
-	else:
-		baseUrl = "http://snac-dev.iath.virginia.edu/api/"
-
-
-	##### Make API calls #####
-
-	# Make API call to check out constellation using "edit" command
-	response = checkOutConstellation(snacID, apiKey, baseUrl)
-
-	# Verify that API call worked; raise an apiError if API call failed
-	try:
-		verifyApiSuccess(response)
-	except apiError as e:
-		msg = "\nCould not check out " + str(snacID)
-		msg += " due to the following error:\n" + e.message
-		raise apiError(msg)
-
-	# Save the ark, id, and version from the response
-	response = response["constellation"]
-	id = response["id"]
-	version = response["version"]
-	ark = response["ark"]
-
-	# Convert each relationship object into a dict representing SNAC JSON form
-	for i in range(len(relationships)):
-		relationships[i] = convertToJson(relationships[i])
-
-	# Use those attributes to build a minimal constellation JSON that includes
-	# the information we want to add, & the OPERATION attr (see walkthrough)
-	miniConst = buildMinimalConstellation(id, version, ark, relationships)
-
-	# Make API call to push our changes, using "update_constellation" command
-	response = pushChangesToSnac(miniConst, apiKey, baseUrl)
-
-	# Verify that last API call worked; raise an apiError if not
-	try:
-		verifyApiSuccess(response)
-	except apiError as e:
-		msg = "\nCould not update " + str(snacID)
-		msg += " due to the following error:\n" + e.message
-		raise apiError(msg)
-
-	# Get miniConst from response to update command
-	miniConst = response["constellation"]
-
-	# Make API call to publish constellation using "publish_constellation" command
-	response = publishConstellation(miniConst, apiKey, baseUrl)
-
-	# Check to see if command succeeded
-	try:
-		verifyApiSuccess(response)
-	except apiError as e:
-		msg = "\nCould not publish " + str(snacID)
-		msg += " due to the following error:\n" + e.message
-		raise apiError(msg)
+	# Check out, update & publish the constellation; raise an apiError if any
+	# of those API calls failed
+	outcome = editConstellation(snacID, relationsBuilder(relationships),
+		apiKey, getApiUrl(production))
+	if not outcome.succeeded:
+		raise outcome.error
 
 def main():
+	# API keys are only needed to make edits, not to plan them
+	import secret
+
 	print("")
 
 	# Unpack argument to get name of tsv file
 	parser = argparse.ArgumentParser()
 	msg = "TSV file with 3 columns (source, type, & target)"
 	parser.add_argument("filename", help=msg)
+	msg = "the most constellations to edit at once"
+	parser.add_argument("--in-flight", type=int, default=4, help=msg)
+	msg = "ignore the journal of earlier runs and edit every constellation"
+	parser.add_argument("--restart", action="store_true", help=msg)
 	args = parser.parse_args()
 	filename = args.filename
 
@@ -202,49 +174,30 @@ def main():
 	# Take appropriate actions based on user response
 	if useProduction == True:
 		apiKey = secret.prodKey # Set appropriate API key
-		prod = True # Set parameter to be passed to insertRelations
+		prod = True # Set parameter to be passed to getApiUrl
 
 	else:
 		apiKey = secret.devKey # Set appropriate API key
-		prod = False # Set parameter to be passed to insertRelations
+		prod = False # Set parameter to be passed to getApiUrl
 
 	# Print a message
 	relCount = len(relationList)
 	srcCount = len(sourceList)
 	print("\nAdding", relCount, "relations to", srcCount, "constellations...")
 
-	# Declare variables to track successes & failures of API calls
-	successCount = 0
-	errors = []
-
-	# Make the API calls
-	for i in range(srcCount):
-		print("Updating constellation", i+1, "...", end="\r")
-
-		agent = list(sourceList)[i]
-		try:
-			insertRelations(agent, apiKey, sourceList[agent], production=prod)
-			successCount += 1
-
-		# If there's an API error, log it and move on to next constellation
-		except apiError as e:
-			errors.append(e)
-			continue
-
-	# Print message
-	print("\nSuccessfully updated", successCount, "constellations.")
-
-	# Print list of API errors encountered
-	numErrors = len(errors)
-	if numErrors > 0:
-		if numErrors == 1:
-			print("Encountered 1 error:")
-		else:
-			print("Encountered", numErrors, "errors:")
-		for error in errors:
-			print(error)
-
-	print("")
+	# Validate sources, pairing each with the changes to make to it
+	# (The relations themselves identify the job in the journal)
+	jobs = []
+	for agent in sourceList:
+		snacID = validateSourceId(agent)
+		if snacID is not None:
+			relations = sourceList[agent]
+			jobs.append((snacID, relationsBuilder(relations),
+				sorted(str(relation) for relation in relations)))
+
+	# Make the API calls, resuming from where any earlier run got to
+	journal = getEditJournal("addRelationsJournal.tsv", prod, args.restart)
+	makeEdits(jobs, apiKey, getApiUrl(prod), args.in_flight, journal)
 
 if __name__ == "__main__":
 	main()
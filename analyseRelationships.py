@@ -1,4 +1,4 @@
-from utils import Relationship
+from utils import Relationship, RelationshipSet, countRelationshipTypes
 
 def loadRelationsFromFile(filename):
 	"""
@@ -46,39 +46,27 @@ def findMissingReciprocals(relationList):
 	Check for non-reciprocal relationships in a list of Relationship objs.
 
 	For every item in the list, check to see if its inverse is in the list.
+	The list is indexed into a RelationshipSet first, so this takes linear
+	time however many relationships there are.
 	@param: relationList, a list of Relationship objects
 	@return: a list of Relationship objs which, if added to relationList,
 				would ensure that all relationships had an inverse
 	"""
-
-	# Initialize list to return
-	missingRecips = []
-
 	# Print a status message
 	print("Checking for relationships without reciprocals…")
 
-	for relation in relationList:
-
-		# Skip "associatedWith" relationships
-		if relation.type == "associatedWith":
-			continue
-
-		# Get the inverse relationship
-		inverse = relation.getInverse()
-
-		# See if the inverse is in the list
-		if inverse not in relationList:
-
-			# Add it to the list of missing inverses if it isn't
-			missingRecips.append(inverse)
-
-#			print("\t".join([relation.source, relation.type, relation.target]))
-#			print("\t".join([inverse.source, inverse.type, inverse.target]))
-#			print("")
+	# Skip "associatedWith" relationships, which are their own inverse
+	relationSet = RelationshipSet(relationList)
+	missingRecips = relationSet.missingReciprocals(relationList)
 
 	#Print status message
 	print("List compiled!")
 
+	# Print a breakdown of what's missing
+	counts = countRelationshipTypes(missingRecips)
+	for type in sorted(counts):
+		print("\t{:25} {:6d}".format(type, counts[type]))
+
 	return missingRecips
 
 def writeRelationshipsToFile(relationList, filename):
@@ -111,4 +99,5 @@ def main():
 
 	print("")
 
-main()
+if __name__ == '__main__':
+	main()
@@ -6,7 +6,20 @@ Written by James Truitt at the Friends Historical Library of Swarthmore College,
 November 2021.
 """
 
-from utils import postToApi, apiError
+import time, requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils import postToApi, apiError, verifyApiSuccess
+from editJournal import CHECKED_OUT, UPDATED, PUBLISHED, RELEASED, FAILED
+from editJournal import QUEUED, EditJournal, jobDigest
+from rateLimiter import serverName
+
+PROD_API_URL = "https://api.snaccooperative.org"
+DEV_API_URL = "http://snac-dev.iath.virginia.edu/api/"
+
+# Errors talking to SNAC (once the client has given up retrying) that doom a
+#	single API call, but not the rest of a bulk edit: dropped connections,
+#	timeouts, HTTP errors, & responses that aren't JSON (e.g. a 502 page)
+TRANSPORT_ERRORS = (requests.exceptions.RequestException, ValueError)
 
 def getUserInput():
 	"""
@@ -143,3 +156,360 @@ def publishConstellation(miniConst, apiKey, baseUrl):
 	response = postToApi(req, baseUrl)
 
 	return response
+
+def unlockConstellation(miniConst, apiKey, baseUrl):
+	"""
+	Release a constellation checked out to a user, without publishing it
+
+	Side effects: Tries to change data on the dev or prod SNAC server
+
+	For more details on the SNAC API and this command, see:
+		https://snac-dev.iath.virginia.edu/api_help#unlock_constellation
+
+	@param: miniConst, a barebones constellation (dataType, ark, id & version)
+	@param: apiKey, str, user API key to authenticate the request
+	@param: baseUrl, str, the URL of the SNAC REST API to call (dev vs. prod)
+	@return: response, the server's response to the API call
+	"""
+	req = {
+	"command": "unlock_constellation",
+	"constellation": miniConst,
+	"apikey": apiKey
+	}
+
+	response = postToApi(req, baseUrl)
+
+	return response
+
+def getApiUrl(production):
+	"""Return the URL of the production or development SNAC API"""
+	return PROD_API_URL if production else DEV_API_URL
+
+def getEditJournal(filename, production, restart=False):
+	"""
+	Open the journal a script keeps of its edits to the dev or prod server
+
+	@param: filename, str, the script's journal file
+	@param: production, bool, whether we're editing the production server
+	@param: restart, bool, whether to forget the journal & start over
+	@return: an EditJournal
+	"""
+	journal = EditJournal(filename, serverName(getApiUrl(production)))
+	if restart:
+		journal.clear()
+	return journal
+
+class EditOutcome:
+	"""
+	The result of running one constellation through checkout, update & publish
+
+	Attributes:
+		snacID: the SNAC ID of the constellation edited
+		steps: list of the form [(step, seconds taken)], for each step that
+			succeeded, in the order they ran
+		failedStep: str, the step that failed ("checkout", "update", "build" or
+			"publish"), or None if every step succeeded
+		error: the apiError that stopped the edit (transport errors are wrapped
+			in one), or None
+		constellation: dict, the constellation as returned by the last
+			successful step
+	"""
+
+	def __init__(self, snacID):
+		self.snacID = snacID
+		self.steps = []
+		self.failedStep = None
+		self.error = None
+		self.constellation = None
+
+	@property
+	def succeeded(self):
+		return self.failedStep is None and len(self.steps) > 0 and \
+			self.steps[-1][0] == "publish"
+
+	def seconds(self):
+		"""Return the total time spent on the constellation's API calls"""
+		return sum(seconds for step, seconds in self.steps)
+
+def journalledConstellation(snacID, journal):
+	"""Build a barebones constellation from an ID's journal entry"""
+	state, step, version, ark, detail, job = journal.entry(snacID)
+	return {
+		"dataType": "Constellation",
+		"ark": ark,
+		"id": snacID,
+		"version": version
+	}
+
+def editConstellation(snacID, buildMiniConst, apiKey, baseUrl, journal=None,
+	job=""):
+	"""
+	Check out, update, and publish one constellation, in that order
+
+	Side effects: Tries to change data on the dev or prod SNAC server
+
+	A step that fails stops the edit there, & is recorded in the outcome rather
+	than raised. That includes SNAC refusing a call & the call itself failing
+	(see TRANSPORT_ERRORS); anything else is a bug, & is raised as usual. If
+	the constellation was checked out but couldn't be updated, it's unlocked
+	again; one that was updated but couldn't be published is left checked
+	out, so a journalled run can publish it next time.
+
+	If a journal is given, each step is recorded in it as soon as SNAC answers,
+	and a constellation the journal says was updated but not published is
+	just published. (If those were changes for a different job, they're
+	published first, & this job's changes are then made as usual.)
+
+	@param: snacID, SNAC ID of the constellation to update
+	@param: buildMiniConst, function taking the checked-out constellation (in
+		dict form) & returning the minimal constellation to push to SNAC
+	@param: apiKey, str, user API key to authenticate the request
+	@param: baseUrl, str, the URL of the SNAC REST API to call (dev vs. prod)
+	@param: journal, an EditJournal to record each step in
+	@param: job, str, the digest of the change being made (see jobDigest)
+	@return: an EditOutcome
+	"""
+	outcome = EditOutcome(snacID)
+	messages = {"checkout": "Could not check out ",
+		"update": "Could not update ", "publish": "Could not publish "}
+	states = {"checkout": CHECKED_OUT, "update": UPDATED, "publish": PUBLISHED}
+
+	def fail(step, error):
+		"""Note a failed step in the outcome (& journal)"""
+		outcome.failedStep = step
+		outcome.error = error
+		if journal is not None:
+			journal.record(snacID, FAILED, step, detail=error)
+
+	def runStep(step, call, *args):
+		"""Make one API call, recording it in the outcome; return success"""
+		start = time.monotonic()
+		try:
+			response = call(*args, apiKey, baseUrl)
+			verifyApiSuccess(response)
+		except (apiError,) + TRANSPORT_ERRORS as e:
+			msg = "\n" + messages[step] + str(snacID)
+			msg += " due to the following error:\n" + describeError(e)
+			fail(step, apiError(msg))
+			return False
+		outcome.steps.append((step, time.monotonic() - start))
+		outcome.constellation = response["constellation"]
+		if journal is not None:
+			journal.record(snacID, states[step],
+				version=outcome.constellation.get("version"),
+				ark=outcome.constellation.get("ark"),
+				job=job if step != "publish" else None)
+		return True
+
+	# If our changes were pushed last time, all that's left is to publish
+	if journal is not None and journal.needsPublish(snacID):
+		sameJob = journal.sameJob(snacID, job)
+		miniConst = journalledConstellation(snacID, journal)
+		if not runStep("publish", publishConstellation, miniConst) or sameJob:
+			return outcome
+
+	# Make API call to check out constellation using "edit" command
+	if not runStep("checkout", checkOutConstellation, snacID):
+		return outcome
+
+	# Build a minimal constellation holding the changes to make
+	try:
+		miniConst = buildMiniConst(outcome.constellation)
+	except apiError as e:
+		fail("build", e)
+		releaseCheckout(outcome.constellation, apiKey, baseUrl, journal)
+		return outcome
+
+	# Push our changes, then publish the constellation returned by SNAC
+	if not runStep("update", pushChangesToSnac, miniConst):
+		releaseCheckout(outcome.constellation, apiKey, baseUrl, journal)
+		return outcome
+	runStep("publish", publishConstellation, outcome.constellation)
+	return outcome
+
+def releaseCheckout(constellation, apiKey, baseUrl, journal=None):
+	"""
+	Unlock a checked-out constellation that couldn't be changed
+
+	Side effects: Tries to change data on the dev or prod SNAC server
+
+	A constellation that can't be unlocked is left for releaseStaleCheckouts
+	(the journal still says it needs releasing).
+
+	@param: constellation, dict, the constellation as checked out
+	@param: apiKey, str, user API key to authenticate the request
+	@param: baseUrl, str, the URL of the SNAC REST API to call (dev vs. prod)
+	@param: journal, an EditJournal to record the release in
+	@return: whether the constellation was released
+	"""
+	miniConst = {
+		"dataType": "Constellation",
+		"ark": constellation.get("ark"),
+		"id": constellation.get("id"),
+		"version": constellation.get("version")
+	}
+	try:
+		verifyApiSuccess(unlockConstellation(miniConst, apiKey, baseUrl))
+	except (apiError,) + TRANSPORT_ERRORS:
+		return False
+	if journal is not None:
+		# Keep the error that stopped the edit, for the record
+		entry = journal.entry(miniConst["id"])
+		journal.record(miniConst["id"], RELEASED,
+			detail=entry[4] if entry is not None else "")
+	return True
+
+def describeError(error):
+	"""Return an error's message, naming its type if it isn't an apiError"""
+	if isinstance(error, apiError):
+		return error.message
+	return type(error).__name__ + ": " + str(error)
+
+def releaseStaleCheckouts(journal, apiKey, baseUrl):
+	"""
+	Unlock every constellation a journal says was left checked out
+
+	Side effects: Tries to change data on the dev or prod SNAC server
+
+	@param: journal, an EditJournal
+	@param: apiKey, str, user API key to authenticate the requests
+	@param: baseUrl, str, the URL of the SNAC REST API to call (dev vs. prod)
+	@return: the number of constellations released
+	"""
+	toRelease = journal.idsToRelease()
+	if len(toRelease) == 0:
+		return 0
+
+	print("Releasing", len(toRelease), "constellations left checked out...")
+	released = 0
+	for snacID in toRelease:
+		miniConst = journalledConstellation(snacID, journal)
+		try:
+			verifyApiSuccess(unlockConstellation(miniConst, apiKey, baseUrl))
+		except (apiError,) + TRANSPORT_ERRORS as e:
+			# Checking it out again will still work, as it's checked out to us
+			journal.record(snacID, FAILED, "release", detail=describeError(e))
+			continue
+		journal.record(snacID, RELEASED)
+		released += 1
+
+	return released
+
+def runEdits(jobs, apiKey, baseUrl, maxInFlight=4, journal=None):
+	"""
+	Edit many constellations concurrently, yielding outcomes as they finish
+
+	Each constellation's checkout, update, & publish calls are made in order by
+	one worker thread, while up to maxInFlight constellations are worked on at
+	once. Calls still share the server's edit rate limit (see rateLimiter).
+
+	@param: jobs, an iterable of tuples of the form (snacID, buildMiniConst)
+		or (snacID, buildMiniConst, change); see editConstellation & unpackJob
+	@param: apiKey, str, user API key to authenticate the requests
+	@param: baseUrl, str, the URL of the SNAC REST API to call (dev vs. prod)
+	@param: maxInFlight, int, the most constellations to edit at once
+	@param: journal, an EditJournal to record each step in
+	@yield: EditOutcome objects, in the order they finished
+	"""
+	pending = {}
+
+	def finished(future):
+		"""Return a finished future's outcome, flagging any fatal error"""
+		snacID = pending.pop(future)
+		try:
+			return future.result()
+		except Exception:
+			print("\nFatal error encountered on constellation", snacID)
+			raise
+
+	with ThreadPoolExecutor(max_workers=maxInFlight) as executor:
+		# Keep the pool topped up with constellations until we run out of jobs
+		for job in jobs:
+			snacID, buildMiniConst, digest = unpackJob(job)
+			future = executor.submit(editConstellation, snacID, buildMiniConst,
+				apiKey, baseUrl, journal, digest)
+			pending[future] = snacID
+			if len(pending) < maxInFlight:
+				continue
+
+			# The pool is full, so hand back whatever finishes first
+			done, notDone = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				yield finished(future)
+
+		# Drain whatever is still in flight
+		while pending:
+			done, notDone = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				yield finished(future)
+
+def unpackJob(job):
+	"""
+	Split a job into its SNAC ID, builder function & the digest of its change
+
+	@param: job, a tuple of the form (snacID, buildMiniConst) or (snacID,
+		buildMiniConst, change), where change is anything JSON-serializable
+		describing the change to make (e.g. the relations to add)
+	@return: a tuple of the form (snacID, buildMiniConst, digest), the digest
+		being "" if the job doesn't describe its change
+	"""
+	if len(job) == 2:
+		return job[0], job[1], ""
+	return job[0], job[1], jobDigest(job[2])
+
+def makeEdits(jobs, apiKey, baseUrl, maxInFlight=4, journal=None):
+	"""
+	Edit many constellations on SNAC, printing progress & a summary of errors
+
+	If a journal is given, the edit resumes from it: constellations left
+	checked out are released first, & constellations already published are
+	skipped, as long as the journal says the same change was published (jobs
+	that don't describe their change match any).
+
+	@param: jobs, an iterable of tuples of the form (snacID, buildMiniConst)
+		or (snacID, buildMiniConst, change); see editConstellation & unpackJob
+	@param: apiKey, str, user API key to authenticate the requests
+	@param: baseUrl, str, the URL of the SNAC REST API to call (dev vs. prod)
+	@param: maxInFlight, int, the most constellations to edit at once
+	@param: journal, an EditJournal to record each step in
+	@return: a list of EditOutcome objects, in the order they finished
+	"""
+	if journal is not None:
+		releaseStaleCheckouts(journal, apiKey, baseUrl)
+
+		# Skip whatever was published last time
+		allJobs = list(jobs)
+		jobs = [job for job in allJobs if
+			not journal.isDone(job[0], unpackJob(job)[2])]
+		skipped = len(allJobs) - len(jobs)
+		if skipped > 0:
+			msg = "Skipping {} constellations whose changes were already "
+			msg += "published (see {}; use --restart to redo them)."
+			print(msg.format(skipped, journal.filename))
+
+		# Note every job before starting, so the journal knows the whole edit
+		journal.recordMany([job[0] for job in jobs if
+			journal.state(job[0]) is None], QUEUED)
+
+	outcomes = []
+	for outcome in runEdits(jobs, apiKey, baseUrl, maxInFlight, journal):
+		outcomes.append(outcome)
+		print("Updating constellation", len(outcomes), "...", end="\r")
+
+	# Print message
+	successCount = len([o for o in outcomes if o.succeeded])
+	print("\nSuccessfully updated", successCount, "constellations.")
+
+	# Print list of API errors encountered
+	errors = [o.error for o in outcomes if not o.succeeded]
+	numErrors = len(errors)
+	if numErrors > 0:
+		if numErrors == 1:
+			print("Encountered 1 error:")
+		else:
+			print("Encountered", numErrors, "errors:")
+		for error in errors:
+			print(error)
+
+	print("")
+	return outcomes
@@ -1,4 +1,4 @@
-from extractRelations import loadSnacData
+from utils import iterSnacData, openSnacStore
 import xml.etree.ElementTree as ET
 
 def validateBiogHist(constellations):
@@ -46,44 +46,38 @@ def checkForPaChester(constellations):
 				if target == "61920242" or content == chesterString:
 					print(constellation["ark"], "is linked to Chester MM in PA")
 
-def checkForMultipleDates(constellations):
-	for constellation in constellations:
-		if "dates" in constellation:
-			if len(constellation["dates"]) > 1:
-				print(constellation["ark"], "has multiple date entries")
-			elif len(constellation["dates"]) == 0:
-				print(constellation["ark"], "has no date entries")
-		else:
-			print(constellation["ark"], "has no date entries")
+def checkForMultipleDates(dateCounts):
+	"""Check for constellations w/ other than 1 date entry, given {ark: #}"""
+	for ark, count in dateCounts.items():
+		if count > 1:
+			print(ark, "has multiple date entries")
+		elif count == 0:
+			print(ark, "has no date entries")
 
-def checkForMultiplePlaces(constellations):
-	"""Check for multiple places listed as birth or as death"""
-	for constellation in constellations:
-		hasBirthPlace, hasDeathPlace = False, False
-		if "places" in constellation:
-			for place in constellation["places"]:
-				if "role" in place:
-					if place["role"]["term"] == "Birth":
-						if hasBirthPlace:
-							print(constellation["ark"], "has multiple birthplaces")
-						else:
-							hasBirthPlace = True
-					if place["role"]["term"] == "Death":
-						if hasDeathPlace:
-							print(constellation["ark"], "has multiple deathplaces")
-						else:
-							hasDeathPlace = True
+def checkForMultiplePlaces(birthCounts, deathCounts):
+	"""Check for multiple places listed as birth or as death, given {ark: #}"""
+	for ark, count in birthCounts.items():
+		if count > 1:
+			print(ark, "has multiple birthplaces")
+	for ark, count in deathCounts.items():
+		if count > 1:
+			print(ark, "has multiple deathplaces")
 
 
 def main():
-	constellations = loadSnacData()
+	# Each check streams through the constellations on its own, so only one
+	#	constellation is in memory at a time, & only the fields it looks at
+	validateBiogHist(iterSnacData(fields=["ark", "biogHists"]))
+	checkForGender(iterSnacData(fields=["ark", "genders"]))
+	checkForRelationships(iterSnacData(fields=["ark", "relations"]))
+	checkForPaChester(iterSnacData(hasField="relations", fields=["ark"]))
 
-	validateBiogHist(constellations)
-	checkForGender(constellations)
-	checkForRelationships(constellations)
-	checkForPaChester(constellations)
-	checkForMultipleDates(constellations)
-	checkForMultiplePlaces(constellations)
+	# Counting entries is a single query on the store's facet tables
+	with openSnacStore() as store:
+		checkForMultipleDates(store.countEntries("dates"))
+		births = store.countEntries("places", role="Birth")
+		deaths = store.countEntries("places", role="Death")
+		checkForMultiplePlaces(births, deaths)
 
 
 
@@ -0,0 +1,75 @@
+"""
+Time getSnacData's constellation fetcher against a local stand-in SNAC server.
+
+Serves a set of canned constellations with an injected per-request delay, then
+fetches all of them with increasing numbers of requests in flight, so that the
+speedup over one-at-a-time fetching can be read straight off the output.
+"""
+
+import argparse, time
+from mockSnacServer import MockSnacServer
+from getSnacData import fetchSnacAgents
+
+def makeCannedConstellations(count):
+	"""Build a list of small placeholder constellations with distinct IDs"""
+	constellations = []
+	for i in range(count):
+		snacID = str(10000000 + i)
+		constellations.append({
+			"dataType": "Constellation",
+			"ark": "http://n2t.net/ark:/99166/w6" + snacID[-6:],
+			"id": snacID,
+			"version": "1"
+		})
+	return constellations
+
+def timeFetch(snacIds, maxInFlight, url):
+	"""Fetch every ID & return (seconds taken, number of failures)"""
+	start = time.perf_counter()
+	failures = 0
+	for snacID, constellation, error in fetchSnacAgents(snacIds, maxInFlight, url):
+		if error is not None:
+			failures += 1
+	return time.perf_counter() - start, failures
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--count", type=int, default=200,
+		help="number of constellations to fetch")
+	parser.add_argument("--latency", type=float, default=0.05,
+		help="seconds the server waits before each response")
+	parser.add_argument("--workers", type=int, nargs="+",
+		default=[1, 4, 8, 16, 32], help="in-flight limits to try")
+	parser.add_argument("--error-rate", type=float, default=0.0,
+		help="share of requests the server fails with a 500 error")
+	parser.add_argument("--throttle-rate", type=float, default=0.0,
+		help="share of requests the server refuses with a 429")
+	parser.add_argument("--rate-limit", type=float,
+		help="requests per second the server allows before answering 429")
+	parser.add_argument("--seed", type=int, default=0,
+		help="seed for the server's random faults")
+	args = parser.parse_args()
+
+	constellations = makeCannedConstellations(args.count)
+	snacIds = [c["id"] for c in constellations]
+
+	server = MockSnacServer(constellations, args.latency, port=0,
+		errorRate=args.error_rate, throttleRate=args.throttle_rate,
+		rateLimit=args.rate_limit, retryAfter=0.05, seed=args.seed)
+	server.startInBackground()
+
+	print("Fetching {} constellations, {:.0f} ms latency each\n".format(
+		args.count, args.latency * 1000))
+	print("{:>9} {:>9} {:>9} {:>9}".format("inFlight", "seconds", "per sec",
+		"failures"))
+
+	for maxInFlight in args.workers:
+		seconds, failures = timeFetch(snacIds, maxInFlight, server.url)
+		print("{:9d} {:9.2f} {:9.1f} {:9d}".format(maxInFlight, seconds,
+			args.count / seconds, failures))
+
+	server.shutdown()
+	print()
+
+if __name__ == "__main__":
+	main()
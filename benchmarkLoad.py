@@ -0,0 +1,87 @@
+"""
+Time loading constellations with different numbers of parsing processes.
+
+Writes sets of placeholder constellation files of increasing size to a
+temporary folder, then times both building the local store from them (parsing
+the pretty-printed files) and reading every constellation back out of it, so
+that the speedup of each process count over a single process can be read
+straight off the output.
+"""
+
+import argparse, json, os, tempfile, time
+from snacStore import SnacStore
+
+def makePlaceholderConstellation(i, paragraphs):
+	"""Build a constellation with a biogHist of roughly realistic size"""
+	snacID = str(10000000 + i)
+	biogHist = "<p>" + "Lorem ipsum dolor sit amet. " * 40 + "</p>"
+	return {
+		"dataType": "Constellation",
+		"ark": "http://n2t.net/ark:/99166/w6" + snacID[-6:],
+		"id": snacID,
+		"version": "1",
+		"entityType": {"id": "700", "term": "person"},
+		"biogHists": [{"text": biogHist * paragraphs}],
+		"relations": [{
+			"sourceConstellation": snacID,
+			"targetConstellation": str(10000000 + (i + 1) % 1000),
+			"type": {"term": "associatedWith"}
+		}] * 10,
+		"subjects": [{"term": {"id": "1234", "term": "Quakers"}}] * 5
+	}
+
+def writePlaceholderFiles(directory, count, paragraphs):
+	"""Write count placeholder constellations to JSON files in a folder"""
+	for i in range(count):
+		constellation = makePlaceholderConstellation(i, paragraphs)
+		filename = os.path.join(directory, constellation["ark"][-8:] + ".json")
+		with open(filename, "w", encoding="utf-8") as f:
+			json.dump(constellation, f, indent=4)
+
+def timeLoad(directory, processes):
+	"""Build a fresh store & read it back; return (sync secs, read secs)"""
+	storeFile = os.path.join(directory, "benchmark.sqlite")
+	if os.path.exists(storeFile):
+		os.remove(storeFile)
+
+	with SnacStore(storeFile, directory) as store:
+		start = time.perf_counter()
+		store.sync(processes)
+		syncSeconds = time.perf_counter() - start
+
+		start = time.perf_counter()
+		for constellation in store.iterConstellations(processes=processes):
+			pass
+		readSeconds = time.perf_counter() - start
+
+	return syncSeconds, readSeconds
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--counts", type=int, nargs="+",
+		default=[250, 1000, 4000], help="numbers of files to load")
+	parser.add_argument("--processes", type=int, nargs="+",
+		default=[1, 2, 4, 8], help="process counts to try")
+	parser.add_argument("--paragraphs", type=int, default=10,
+		help="size of each placeholder biogHist, in paragraphs")
+	args = parser.parse_args()
+
+	print("{:>7} {:>9} {:>9} {:>9} {:>9}".format("files", "processes",
+		"sync s", "read s", "speedup"))
+
+	for count in args.counts:
+		with tempfile.TemporaryDirectory() as directory:
+			writePlaceholderFiles(directory, count, args.paragraphs)
+
+			baseline = None
+			for processes in args.processes:
+				syncSeconds, readSeconds = timeLoad(directory, processes)
+				total = syncSeconds + readSeconds
+				if baseline is None:
+					baseline = total
+				print("{:7d} {:9d} {:9.2f} {:9.2f} {:8.2f}x".format(count,
+					processes, syncSeconds, readSeconds, baseline / total))
+		print()
+
+if __name__ == "__main__":
+	main()
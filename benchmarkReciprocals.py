@@ -0,0 +1,74 @@
+"""
+Time the search for missing reciprocal relationships on random graphs.
+
+Builds lists of random relationships of increasing size, about half of which
+have their inverse in the list, and times analyseRelationships'
+findMissingReciprocals on each. With --naive, small lists are also checked the
+old way (a linear scan of the list per relationship) for comparison.
+"""
+
+import argparse, io, random, time
+from contextlib import redirect_stdout
+from utils import Relationship
+from analyseRelationships import findMissingReciprocals
+
+def makeRandomRelationships(count, numIds, seed=0):
+	"""Build a list of count random relationships between numIds IDs"""
+	rng = random.Random(seed)
+	types = list(Relationship.inverseList) + ["associatedWith"]
+	ids = [str(10000000 + i) for i in range(numIds)]
+
+	relations = []
+	while len(relations) < count:
+		source, target = rng.sample(ids, 2)
+		relation = Relationship(source, target, rng.choice(types))
+		relations.append(relation)
+		# Give about half of them their reciprocal
+		if rng.random() < 0.5 and len(relations) < count:
+			relations.append(relation.getInverse())
+	return relations
+
+def findMissingNaively(relationList):
+	"""The old, quadratic check of every inverse against the list itself"""
+	missing = []
+	for relation in relationList:
+		if relation.type == "associatedWith":
+			continue
+		inverse = relation.getInverse()
+		if inverse not in relationList:
+			missing.append(inverse)
+	return missing
+
+def timeCall(function, relations):
+	"""Call function(relations) quietly; return (seconds, # results)"""
+	start = time.perf_counter()
+	with redirect_stdout(io.StringIO()):
+		result = function(relations)
+	return time.perf_counter() - start, len(result)
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--counts", type=int, nargs="+",
+		default=[1000, 10000, 100000, 1000000], help="numbers of relationships")
+	msg = "also time the old list-based check on lists up to this size"
+	parser.add_argument("--naive", type=int, default=0, help=msg)
+	args = parser.parse_args()
+
+	print("{:>9} {:>9} {:>10} {:>10}".format("edges", "missing", "indexed s",
+		"naive s"))
+
+	for count in args.counts:
+		relations = makeRandomRelationships(count, max(count // 4, 10))
+		seconds, missing = timeCall(findMissingReciprocals, relations)
+
+		naive = ""
+		if count <= args.naive:
+			naiveSeconds, naiveMissing = timeCall(findMissingNaively, relations)
+			assert naiveMissing == missing
+			naive = "{:10.2f}".format(naiveSeconds)
+
+		print("{:9d} {:9d} {:10.2f} {:>10}".format(count, missing, seconds,
+			naive))
+
+if __name__ == "__main__":
+	main()
@@ -2,6 +2,7 @@
 Read in a series of JSON files representing SNAC constellations;
 convert into JSONs acceptable to the ArchivesSpace agent module.
 """
+import argparse
 import json, re
 from glob import glob
 from random import choices
@@ -203,8 +204,13 @@ def writeJsons(agents):
 		print("\tDone.")
 
 def main():
+	parser = argparse.ArgumentParser()
+	msg = "number of processes to parse the JSON with"
+	parser.add_argument("--processes", type=int, default=1, help=msg)
+	args = parser.parse_args()
+
 	print("\n")
-	constellations = loadSnacData()
+	constellations = loadSnacData(processes=args.processes)
 	agents = convertToAgents(constellations)
 	# writeJsons(agents)
 	print("\n")
@@ -0,0 +1,126 @@
+"""
+Keeps track of which constellations a bulk download has already fetched.
+
+The journal is an append-only TSV (`snac_jsons/downloadJournal.tsv`) of the
+form ID, state, attempts, detail. Each change of state appends a line, and the
+last line for an ID wins, so an interrupted download loses at most the line it
+was writing. Deleting the file (or the whole `snac_jsons` folder) starts over.
+"""
+
+import os
+
+PENDING = "pending"
+FETCHED = "fetched"
+FAILED = "failed"
+
+class DownloadJournal:
+	"""
+	The download state of every SNAC ID a bulk download has been asked for
+
+	Attributes:
+		filename: str, the TSV file the journal is kept in
+		entries: dict of the form {SNAC ID: [state, attempts, detail]}
+			(detail is the file written for fetched IDs, else an error message)
+	"""
+
+	def __init__(self, filename="snac_jsons/downloadJournal.tsv"):
+		self.filename = filename
+		self.entries = {}
+		self.load()
+
+	def load(self):
+		"""Read the journal file, if there is one, into self.entries"""
+		if not os.path.exists(self.filename):
+			return
+
+		with open(self.filename, encoding="utf-8") as f:
+			rows = f.read().split("\n")
+
+		# Discard header row
+		del rows[0]
+
+		for row in rows:
+			# Skip blank lines & any line cut short by a crash
+			fields = row.split("\t")
+			if len(fields) != 4:
+				continue
+			snacID, state, attempts, detail = fields
+			self.entries[snacID] = [state, int(attempts), detail]
+
+	def record(self, snacID, state, detail="", newAttempt=False):
+		"""
+		Update an ID's state, both in memory and on disk
+
+		@param: snacID, str, the SNAC ID whose state has changed
+		@param: state, str, one of PENDING, FETCHED or FAILED
+		@param: detail, str, the file written or the error encountered
+		@param: newAttempt, bool, whether to count this as another attempt
+		"""
+		self.recordMany([snacID], state, detail, newAttempt)
+
+	def recordMany(self, snacIds, state, detail="", newAttempt=False):
+		"""Give several IDs the same new state with a single write"""
+		# Tabs & newlines would break the TSV
+		detail = " ".join(str(detail).split())
+
+		lines = []
+		for snacID in snacIds:
+			snacID = str(snacID)
+			attempts = self.attempts(snacID) + (1 if newAttempt else 0)
+			self.entries[snacID] = [state, attempts, detail]
+			lines.append("\t".join([snacID, state, str(attempts), detail]))
+
+		if len(lines) == 0:
+			return
+
+		# Write a header row if this is a new journal
+		needsHeader = not os.path.exists(self.filename)
+		with open(self.filename, "a", encoding="utf-8") as f:
+			if needsHeader:
+				f.write("ID\tState\tAttempts\tDetail\n")
+			f.write("\n".join(lines) + "\n")
+			f.flush()
+
+	def state(self, snacID):
+		"""Return an ID's current state (PENDING if we've never seen it)"""
+		return self.entries.get(str(snacID), [PENDING, 0, ""])[0]
+
+	def attempts(self, snacID):
+		"""Return how many times we've tried to fetch an ID"""
+		return self.entries.get(str(snacID), [PENDING, 0, ""])[1]
+
+	def idsToFetch(self, snacIds, maxAttempts=None):
+		"""
+		Filter a list of IDs down to the ones that still need fetching
+
+		An ID needs fetching unless it's been fetched and its file still exists.
+		Failed IDs are retried until they've used up maxAttempts (if given).
+
+		@param: snacIds, list of SNAC IDs
+		@param: maxAttempts, int, give up on IDs that have failed this many times
+		@return: list of SNAC IDs, in the order they were given
+		"""
+		toFetch = []
+		for snacID in snacIds:
+			state, attempts, detail = self.entries.get(str(snacID),
+				[PENDING, 0, ""])
+			if state == FETCHED and os.path.exists(detail):
+				continue
+			if state == FAILED and maxAttempts is not None:
+				if attempts >= maxAttempts:
+					continue
+			toFetch.append(snacID)
+		return toFetch
+
+	def countStates(self):
+		"""Return a dict of the form {state: number of IDs in that state}"""
+		counts = {PENDING: 0, FETCHED: 0, FAILED: 0}
+		for state, attempts, detail in self.entries.values():
+			counts[state] = counts.get(state, 0) + 1
+		return counts
+
+	def clear(self):
+		"""Forget everything & delete the journal file"""
+		self.entries = {}
+		if os.path.exists(self.filename):
+			os.remove(self.filename)
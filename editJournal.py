@@ -0,0 +1,206 @@
+"""
+Keeps track of how far a bulk edit has got with each constellation.
+
+Editing a constellation takes three API calls (checkout, update, publish), and
+a crash between them can leave a constellation checked out, or updated but not
+published. The journal is an append-only TSV of the form server, ID, job,
+state, step, version, ark, time, detail, written (and fsync'd) before the
+script moves on from each step, so after a crash it's known exactly where every
+constellation got to. The last line for a server & ID wins, so an interrupted
+run loses at most the line it was writing.
+
+Each entry also notes which change was being made (a digest of it; see
+jobDigest), so a constellation is only skipped as published if it's the same
+change being asked for again. A later run with new data (e.g. a new
+idsToUpdate.tsv) makes its changes, even to constellations edited before.
+
+Each editing script keeps its own journal (e.g. `addRelationsJournal.tsv`).
+Running the script again resumes from the journal: published constellations
+are skipped, stale checkouts are released, and updated constellations are just
+published. Deleting the file (or using `--restart`) starts over.
+"""
+
+import hashlib, json, os, threading, time
+
+QUEUED = "queued"
+CHECKED_OUT = "checkedOut"
+UPDATED = "updated"
+PUBLISHED = "published"
+RELEASED = "released"
+FAILED = "failed"
+
+class EditJournal:
+	"""
+	The edit state of every constellation a bulk edit has been asked to change
+
+	Attributes:
+		filename: str, the TSV file the journal is kept in
+		server: str, the server the entries apply to (e.g. "prod" or "dev")
+		entries: dict of the form
+			{SNAC ID: [state, step, version, ark, detail, job]}
+			(step is the step that failed, for FAILED entries; version & ark
+			are from the last response SNAC sent about the constellation; job
+			is the digest of the change being made, "" if unknown)
+	"""
+
+	def __init__(self, filename, server):
+		self.filename = filename
+		self.server = server
+		self.entries = {}
+		self.lock = threading.Lock()
+		self.load()
+
+	def load(self):
+		"""Read this server's entries from the journal file, if there is one"""
+		if not os.path.exists(self.filename):
+			return
+
+		with open(self.filename, encoding="utf-8") as f:
+			rows = f.read().split("\n")
+
+		# Discard header row
+		del rows[0]
+
+		for row in rows:
+			# Skip blank lines & any line cut short by a crash
+			fields = row.split("\t")
+			if len(fields) == 8:
+				# Journals from before jobs were recorded
+				fields.insert(2, "")
+			if len(fields) != 9 or fields[0] != self.server:
+				continue
+			server, snacID, job, state, step, version, ark, when, detail = \
+				fields
+			self.entries[snacID] = [state, step, version, ark, detail, job]
+
+	def record(self, snacID, state, step="", version=None, ark=None,
+		detail="", job=None):
+		"""
+		Update an ID's state, both in memory and on disk
+
+		Safe to call from several threads at once. Returns once the line is
+		on disk.
+
+		@param: snacID, the SNAC ID whose state has changed
+		@param: state, str, one of the states above
+		@param: step, str, the step that failed, for FAILED entries
+		@param: version, str, the constellation's version (by default, the last
+			one recorded)
+		@param: ark, str, the constellation's ark (by default, the last one
+			recorded)
+		@param: detail, str, e.g. the error encountered
+		@param: job, str, the digest of the change being made (by default, the
+			last one recorded)
+		"""
+		self.recordMany([snacID], state, step, version, ark, detail, job)
+
+	def recordMany(self, snacIds, state, step="", version=None, ark=None,
+		detail="", job=None):
+		"""Give several IDs the same new state with a single write"""
+		# Tabs & newlines would break the TSV
+		detail = " ".join(str(detail).split())
+		when = "{:.0f}".format(time.time())
+
+		with self.lock:
+			lines = []
+			for snacID in snacIds:
+				snacID = str(snacID)
+				old = list(self.entries.get(snacID,
+					[QUEUED, "", "", "", "", ""]))
+				if version is not None:
+					old[2] = str(version)
+				if ark is not None:
+					old[3] = ark
+				if job is not None:
+					old[5] = job
+				entry = [state, step, old[2], old[3], detail, old[5]]
+				self.entries[snacID] = entry
+				lines.append("\t".join([self.server, snacID, entry[5],
+					entry[0], entry[1], entry[2], entry[3], when, entry[4]]))
+
+			if len(lines) == 0:
+				return
+
+			# Write a header row if this is a new journal
+			needsHeader = not os.path.exists(self.filename)
+			with open(self.filename, "a", encoding="utf-8") as f:
+				if needsHeader:
+					f.write("Server\tID\tJob\tState\tStep\tVersion\tArk\t")
+					f.write("Time\tDetail\n")
+				f.write("\n".join(lines) + "\n")
+				f.flush()
+				os.fsync(f.fileno())
+
+	def state(self, snacID):
+		"""Return an ID's current state (None if we've never seen it)"""
+		entry = self.entries.get(str(snacID))
+		return entry[0] if entry is not None else None
+
+	def entry(self, snacID):
+		"""
+		Return an ID's entry: [state, step, version, ark, detail, job], or None
+		"""
+		return self.entries.get(str(snacID))
+
+	def sameJob(self, snacID, job):
+		"""
+		Return whether an ID's entry is for the given change
+
+		An unknown change (an empty digest, on either side) matches any, so
+		journals & callers that don't record jobs behave as they used to.
+		"""
+		entry = self.entries.get(str(snacID))
+		if entry is None:
+			return False
+		return not job or not entry[5] or entry[5] == job
+
+	def isDone(self, snacID, job=""):
+		"""Return whether the given change has already been published"""
+		return self.state(snacID) == PUBLISHED and self.sameJob(snacID, job)
+
+	def needsRelease(self, snacID):
+		"""Return whether a constellation was left checked out"""
+		entry = self.entries.get(str(snacID))
+		if entry is None:
+			return False
+		state, step = entry[0], entry[1]
+		return state == CHECKED_OUT or \
+			(state == FAILED and step in ("build", "update"))
+
+	def needsPublish(self, snacID):
+		"""Return whether a constellation was updated but not yet published"""
+		entry = self.entries.get(str(snacID))
+		if entry is None:
+			return False
+		state, step = entry[0], entry[1]
+		return state == UPDATED or (state == FAILED and step == "publish")
+
+	def idsToRelease(self):
+		"""Return the IDs of every constellation left checked out"""
+		return [snacID for snacID in self.entries if self.needsRelease(snacID)]
+
+	def countStates(self):
+		"""Return a dict of the form {state: number of IDs in that state}"""
+		counts = {}
+		for entry in self.entries.values():
+			counts[entry[0]] = counts.get(entry[0], 0) + 1
+		return counts
+
+	def clear(self):
+		"""Forget everything & delete the journal file (for every server)"""
+		with self.lock:
+			self.entries = {}
+			if os.path.exists(self.filename):
+				os.remove(self.filename)
+
+def jobDigest(change):
+	"""
+	Return a short digest identifying a change to a constellation
+
+	@param: change, anything JSON-serializable (other objects are turned into
+		strings) describing the change, e.g. the dict of outdated IDs to
+		replace, or a planned minimal constellation
+	@return: str, a hex digest, the same for the same change on every run
+	"""
+	text = json.dumps(change, sort_keys=True, default=str)
+	return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
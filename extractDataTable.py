@@ -1,27 +1,4 @@
-from glob import glob
-import json
-
-def loadSnacData():
-	"""
-	Read SNAC JSON data from files in the snac_jsons folder.
-
-	Returns: constellations, a list of SNAC JSONs in dict form
-	"""
-	# Get list of filenames to read
-	filenames = glob("snac_jsons/*.json")
-
-	# Initialize array of constellations to eventually return
-	constellations = []
-
-	# Loop over filenames, reading the files & adding the data to constellations
-	print("Reading {} JSON files...")
-	for filename in filenames:
-		print("Reading {}".format(filename + "..."), end="")
-		with open(filename) as f:
-			constellations.append(json.load(f))
-		print("\tdone")
-	print("JSON files read successfully.\n")
-	return constellations
+from utils import iterSnacData
 
 def extractData(constellation):
 	"""
@@ -81,7 +58,7 @@ def getMonthlyMeeting(constellation):
 
 		# Loop over relationships, checking if the target is a monthly meeting
 		for link in constellation["relations"]:
-			if link["type"]["term"] == "memberOf"
+			if link["type"]["term"] == "memberOf":
 				if "monthly meeting" in link["content"].lower():
 					# If the target is a monthly meeting, add it to the meeting list
 					meetingList.append(link["content"])
@@ -114,14 +91,15 @@ def getMonthlyMeeting(constellation):
 	return "Unknown"
 
 def main():
-	# Load constellation data
-	constellations = loadSnacData()
+	# Load just the people, with only the fields the table needs
+	fields = ["ark", "nameEntries", "genders", "occupations", "subjects",
+		"relations"]
+	constellations = iterSnacData(entityType="person", fields=fields)
 
 	# Loop over constellations, extracting data and adding it to "output" list
 	output = []
 	for item in constellations:
-		if item["entityType"]["term"] == "person":
-			output.append(extractData(item))
+		output.append(extractData(item))
 
 	# Write output to .tsv file
 	header="id\tlabel\tGender\tOccupations\tSubjects\tMonthly Meeting\t\n"
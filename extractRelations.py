@@ -2,11 +2,17 @@
 This script reads in the data from a group of JSON files representing SNAC
 constellations and writes the relationship data they contain to 
 relationshipTable.tsv. The TSV is in the format `source\tlabel\ttarget`
+
+Run with `--edges FILE` to also write the relations to a compact binary file
+for downstream tools (see writeRelations for the format).
 """
 
-from glob import glob
-import json
-from utils import loadSnacData
+import argparse, struct
+from contextlib import ExitStack
+from utils import Relationship, openSnacStore
+
+# One relation in a binary edge file: source ID, type term ID, target ID
+EDGE = struct.Struct("<III")
 
 def extractRelations(constellation):
 		"""
@@ -36,51 +42,62 @@ def extractRelations(constellation):
 
 		return data
 
-def main():
-	# Load data
-	constellations = loadSnacData()
-
-	# Loop over constellations, extracting their relationships into a list
-	#	and compiling a list of their SNAC IDs
-	output = []
-	ids = []
+def writeRelations(constellations, ids, tsvFile, edgeFile=None):
+	"""
+	Write the relations among a set of constellations, one row at a time
+
+	Relations whose target isn't in ids are left out. Each relation is written
+	as soon as it's read, so this takes a single pass & no extra memory.
+
+	Params: @constellations, an iterable of SNAC constellations in dict form
+			@ids, a set of the SNAC IDs in the collection
+			@tsvFile, an open text file to write source\tlabel\ttarget rows to
+			@edgeFile, an open binary file to also write each relation to, as
+			 three little-endian uint32s: source ID, type term ID, target ID
+	Returns: the number of relations written
+	"""
+	count = 0
 	for constellation in constellations:
-		# Add get relation list from constellation; add contents to output list
-		output = output + extractRelations(constellation)
-
-		# Add the constellation's SNAC ID to the list we're keeping track of
-		ids.append(constellation["id"])
-
-	# Remove links to constellations not in our data set
-	#	(loop over list backwards b/c we're modifying it)
-	i = len(output)
-	while i > 0:
-		i -= 1
-		# Get relationship
-		link = output[i]
-
-		# Get target of relationship
-		target = link[2]
-
-		# Delete the link if its target isn't in our dataset
-		if target not in ids:
-			del output[i]
-
-	# Remove trailing periods from names
-	for row in output:
-		for i in range(len(row)):
-			while row[i][-1]==".":
-				row[i] = row[i][0:-1]
-
-	# Write output to .tsv file
-	header="source\tlabel\ttarget\t\n"
-	with open("relationshipTable.tsv","w") as f:
-		f.write(header)
-
-		# Piece together string that will represent row of TSV
-		for relationshipList in output:
-			toWrite = "\t".join(relationshipList)
-			f.write(toWrite+"\n")
+		for row in extractRelations(constellation):
+			# Skip links to constellations not in our data set
+			if row[2] not in ids:
+				continue
+
+			# Remove trailing periods from names
+			for i in range(len(row)):
+				while row[i][-1]==".":
+					row[i] = row[i][0:-1]
+
+			tsvFile.write("\t".join(row) + "\n")
+			if edgeFile is not None:
+				typeId = Relationship.typeIDList.get(row[1], "0")
+				edgeFile.write(EDGE.pack(int(row[0]), int(typeId), int(row[2])))
+			count += 1
+	return count
+
+def main():
+	parser = argparse.ArgumentParser()
+	msg = "also write the relations to this binary edge file"
+	parser.add_argument("--edges", default=None, help=msg)
+	args = parser.parse_args()
+
+	with openSnacStore() as store:
+		# The IDs come straight from the store's index, so only one pass
+		#	over the constellations themselves is needed
+		ids = store.ids()
+		constellations = store.iterConstellations(hasField="relations",
+			fields=["id", "ark", "relations"])
+
+		with ExitStack() as files:
+			tsvFile = files.enter_context(open("relationshipTable.tsv", "w"))
+			edgeFile = None
+			if args.edges is not None:
+				edgeFile = files.enter_context(open(args.edges, "wb"))
+
+			tsvFile.write("source\tlabel\ttarget\t\n")
+			count = writeRelations(constellations, ids, tsvFile, edgeFile)
+
+	print("Wrote {} relations to relationshipTable.tsv.".format(count))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,439 @@
+"""
+Generate synthetic SNAC constellations for scale benchmarks.
+
+Writes any number of constellation JSON files shaped like the ones
+getSnacData.py downloads (the same keys, nesting & term IDs, pretty-printed &
+named after their arks), so every stage of the pipeline, from loading &
+auditing through relationship analysis, ID updates & the EAC export, can be
+tried at sizes far beyond the real data set.
+
+The shape of the data set can be controlled:
+	--count: how many constellations to write
+	--mean-degree & --degree: how many relations each constellation has, on
+		average, & whether the number is spread evenly ("uniform") or heavy
+		tailed, with a few very well connected constellations ("powerlaw")
+	--reciprocal-rate: the share of relations whose inverse is also recorded
+	--outdated-rate: the share of relations pointing at a merged (outdated)
+		ID; the merges are listed in idsToUpdate.tsv, as getUpdatedIds writes
+	--duplicate-subject-rate: the share of constellations with a subject
+		recorded twice
+
+Output is the same for the same options & --seed. For example:
+	python3 generateConstellations.py --count 100000 --output synthetic_jsons
+"""
+
+import argparse, itertools, json, os, random, time
+from utils import Relationship
+
+ARK_PREFIX = "http://n2t.net/ark:/99166/"
+TERM_URL = "http://socialarchive.iath.virginia.edu/control/term#"
+
+# Entity types, as (term, term ID)
+PERSON = ("person", "700")
+CORPORATE_BODY = ("corporateBody", "698")
+FAMILY = ("family", "699")
+
+# Relation types, weighted roughly as they occur in the real data
+RELATION_TYPES = ["associatedWith", "correspondedWith", "memberOf",
+	"hasMember", "parentOf", "childOf", "siblingOf", "spouseOf", "employeeOf",
+	"employerOf", "founderOf", "foundedBy", "relativeOf", "acquaintanceOf"]
+RELATION_WEIGHTS = [60, 10, 4, 4, 3, 3, 3, 3, 2, 2, 1, 1, 2, 2]
+
+FORENAMES = ["Abigail", "Benjamin", "Caleb", "Deborah", "Elisha", "Esther",
+	"Hannah", "Isaac", "Jonathan", "Lucretia", "Mary", "Rachel", "Samuel",
+	"Sarah", "Thomas", "William"]
+SURNAMES = ["Benezet", "Collins", "Fox", "Hooton", "Hunt", "Mott", "Penn",
+	"Roberts", "Warrington", "Woolman", "Wood", "Yarnall", "Evans", "Comly",
+	"Hallowell", "Lippincott", "Moore", "Sharpless", "Townsend", "Wistar"]
+MEETINGS = ["Evesham", "Chester", "Haddonfield", "Burlington", "Abington",
+	"Darby", "Radnor", "Concord", "Goshen", "Bradford"]
+
+SUBJECTS = [("334720", "Society of Friends"), ("334723", "Quakers"),
+	("334982", "Antislavery movements"), ("335117", "Women's rights"),
+	("335412", "Temperance"), ("335518", "Education"),
+	("335604", "Peace movements"), ("335891", "Indians of North America"),
+	("336007", "Abolitionists"), ("336214", "Meetinghouses")]
+OCCUPATIONS = [("23191", "Quakers"), ("23340", "Ministers"),
+	("23512", "Teachers"), ("23688", "Merchants"), ("23791", "Farmers"),
+	("23904", "Physicians"), ("24011", "Abolitionists")]
+
+# Places, as (name, latitude, longitude, country code)
+PLACES = [("Philadelphia", "39.95233", "-75.16379", "US"),
+	("Burlington", "40.07122", "-74.86489", "US"),
+	("Chester", "39.84967", "-75.35707", "US"),
+	("London", "51.50853", "-0.12574", "GB"),
+	("Swarthmore", "39.90206", "-75.34991", "US"),
+	("Wilmington", "39.74595", "-75.54659", "US"),
+	("Baltimore", "39.29038", "-76.61219", "US"),
+	("New York", "40.71427", "-74.00597", "US")]
+
+LOREM = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 8
+
+class ConstellationGenerator:
+	"""
+	Builds a synthetic data set of SNAC constellations
+
+	Relations are planned for the whole data set up front (as compact lists of
+	integers), so each constellation can then be built & written on its own.
+
+	Attributes:
+		count: int, how many constellations to generate
+		seed: int, the random seed the whole data set is derived from
+		relations: list, indexed by constellation number, of lists of tuples
+			of the form (relation type, target number, outdated ID number or
+			None)
+		merges: list of the form [(outdated ID number, constellation number)]
+		mergesByTarget: dict of the form {constellation number: [outdated ID
+			numbers merged into it]}
+	"""
+
+	def __init__(self, count, seed=0, meanDegree=5.0, degree="powerlaw",
+		alpha=2.0, reciprocalRate=0.5, outdatedRate=0.02,
+		duplicateSubjectRate=0.05, paragraphs=1):
+		self.count = count
+		self.seed = seed
+		self.meanDegree = meanDegree
+		self.degree = degree
+		self.alpha = alpha
+		self.reciprocalRate = reciprocalRate
+		self.outdatedRate = outdatedRate
+		self.duplicateSubjectRate = duplicateSubjectRate
+		self.paragraphs = paragraphs
+		self.relations = [[] for i in range(count)]
+		self.merges = []
+		self.mergesByTarget = {}
+		self.planRelations()
+
+	def snacID(self, i):
+		"""Return constellation number i's SNAC ID"""
+		return str(10000000 + i)
+
+	def ark(self, i, prefix="w6"):
+		"""Return constellation number i's ark (8 characters, like SNAC's)"""
+		digits = "0123456789bcdfghjkmnpqrstvwxz"
+		suffix = ""
+		for place in range(6):
+			i, digit = divmod(i, len(digits))
+			suffix = digits[digit] + suffix
+		return ARK_PREFIX + prefix + suffix
+
+	def outdatedID(self, k):
+		"""Return outdated ID number k's SNAC ID"""
+		return str(20000000 + k)
+
+	def outdatedArk(self, k):
+		"""Return outdated ID number k's ark"""
+		return self.ark(k, prefix="w7")
+
+	def entityType(self, i):
+		"""Return constellation number i's entity type, as (term, term ID)"""
+		if i % 10 == 8:
+			return CORPORATE_BODY
+		if i % 10 == 9:
+			return FAMILY
+		return PERSON
+
+	def name(self, i):
+		"""Return constellation number i's (authorized) name"""
+		surname = SURNAMES[i % len(SURNAMES)]
+		entityType = self.entityType(i)
+		if entityType == CORPORATE_BODY:
+			meeting = MEETINGS[(i // 10) % len(MEETINGS)]
+			return "{} Monthly Meeting ({})".format(meeting, i)
+		if entityType == FAMILY:
+			return "{} family ({})".format(surname, i)
+		forename = FORENAMES[(i // len(SURNAMES)) % len(FORENAMES)]
+		born, died = self.lifespan(i)
+		return "{}, {}, {}-{}".format(surname, forename, born, died)
+
+	def lifespan(self, i):
+		"""Return constellation number i's years of birth & death"""
+		if self.entityType(i) != PERSON:
+			return 1700, 1900
+		born = 1650 + i % 200
+		return born, born + 40 + i % 45
+
+	def planRelations(self):
+		"""Decide every relation in the data set, & which IDs are outdated"""
+		rng = random.Random(self.seed)
+		if self.count < 2:
+			return
+
+		for source in range(self.count):
+			for n in range(self._drawDegree(rng)):
+				target = rng.randrange(self.count - 1)
+				if target >= source:
+					target += 1 # No relations from a constellation to itself
+				type = rng.choices(RELATION_TYPES, RELATION_WEIGHTS)[0]
+
+				# Point some relations at a merged-away ID of their target
+				outdated = None
+				if rng.random() < self.outdatedRate:
+					outdated = len(self.merges)
+					self.merges.append((outdated, target))
+					self.mergesByTarget.setdefault(target, []).append(outdated)
+				self.relations[source].append((type, target, outdated))
+
+				if rng.random() < self.reciprocalRate:
+					inverse = Relationship.inverseList.get(type, type)
+					self.relations[target].append((inverse, source, None))
+
+	def _drawDegree(self, rng):
+		"""Pick how many relations a constellation starts out with"""
+		if self.degree == "uniform":
+			return rng.randint(0, int(round(2 * self.meanDegree)))
+
+		# Pareto with minimum xm has mean xm * alpha / (alpha - 1)
+		xm = self.meanDegree * (self.alpha - 1) / self.alpha
+		degree = int(xm * rng.paretovariate(self.alpha))
+		return min(degree, self.count - 1)
+
+	def constellation(self, i):
+		"""Build constellation number i, in dict form"""
+		rng = random.Random("{}-{}".format(self.seed, i))
+		snacID = self.snacID(i)
+		version = str(11000000 + rng.randrange(1000000))
+
+		# Give every item its own ID, however many items there are
+		itemIds = itertools.count(int(snacID) * 10**6)
+
+		def item(dataType, **fields):
+			"""Build a constellation component with its own ID & version"""
+			entry = {"dataType": dataType}
+			entry.update(fields)
+			entry["id"] = str(next(itemIds))
+			entry["version"] = version
+			return entry
+
+		entityTerm, entityTermId = self.entityType(i)
+		constellation = {
+			"dataType": "Constellation",
+			"ark": self.ark(i),
+			"entityType": term(entityTermId, entityTerm, "entity_type", True),
+			"maintenanceStatus": {"term": "revised"},
+			"maintenanceAgency": "SNAC: Social Networks and Archival Context",
+			"maintenanceEvents": self._maintenanceEvents(i, rng),
+			"sources": [item("Source",
+				type=term("28296", "simple", "source_type"),
+				text="Synthetic source for constellation " + snacID + ".",
+				citation="Generated by generateConstellations.py")],
+			"languagesUsed": [item("Language", **language())],
+			"nameEntries": [item("NameEntry", original=self.name(i),
+				preferenceScore="99",
+				contributors=[item("Contributor",
+					type=term("7658", "authorizedForm", "name_type"),
+					rule=term("7661", "rda", "name_rule"))],
+				components=[item("NameComponent", text=self.name(i),
+					order="1", type=term("400223", "Surname",
+					"name_component"))],
+				language=item("Language", **language()))],
+			"biogHists": [item("BiogHist", language=item("Language",
+				**language()), text=self._biogHist(i))],
+		}
+
+		if entityTerm == "person":
+			constellation["occupations"] = [item("Occupation",
+				term=term(termId, name, "occupation")) for termId, name in
+				rng.sample(OCCUPATIONS, rng.randint(0, 3))]
+
+		constellation["relations"] = [self._relation(i, item, *relation)
+			for relation in self.relations[i]]
+		constellation["places"] = self._places(i, rng, item)
+
+		subjects = [item("Subject", term=term(termId, name, "subject"))
+			for termId, name in rng.sample(SUBJECTS, rng.randint(1, 4))]
+		if rng.random() < self.duplicateSubjectRate:
+			duplicate = dict(rng.choice(subjects))
+			duplicate["id"] = str(next(itemIds))
+			subjects.append(duplicate)
+		constellation["subjects"] = subjects
+
+		if entityTerm == "person":
+			gender = rng.choice([("7655", "Male"), ("7656", "Female")])
+			constellation["genders"] = [item("Gender",
+				term=term(gender[0], gender[1], "gender"))]
+
+		constellation["id"] = snacID
+		constellation["version"] = version
+		constellation["dates"] = [self._dates(i, item)]
+		return constellation
+
+	def _relation(self, i, item, type, target, outdated):
+		"""Build a relation from constellation number i to another"""
+		if outdated is None:
+			targetID, targetArk = self.snacID(target), self.ark(target)
+		else:
+			targetID = self.outdatedID(outdated)
+			targetArk = self.outdatedArk(outdated)
+		entityTerm, entityTermId = self.entityType(target)
+		return item("ConstellationRelation",
+			sourceConstellation=self.snacID(i),
+			targetConstellation=targetID,
+			sourceArkID=self.ark(i),
+			targetArkID=targetArk,
+			targetEntityType=term(entityTermId, entityTerm, "entity_type",
+				True),
+			type=term(Relationship.typeIDList[type], type, "relation_type",
+				True),
+			content=self.name(target) + ".")
+
+	def _maintenanceEvents(self, i, rng):
+		"""Build a constellation's maintenance history"""
+		def event(eventType, when, description=None):
+			entry = {
+				"dataType": "MaintenanceEvent",
+				"eventType": term("704" if eventType == "revised" else "703",
+					eventType, "event_type"),
+				"eventDateTime": when,
+				"standardDateTime": when,
+				"agentType": term("400254", "human", "agent_type"),
+				"agent": "generateConstellations.py"
+			}
+			if description is not None:
+				entry["eventDescription"] = description
+			return entry
+
+		day = 1 + rng.randrange(28)
+		events = [event("created", "2015-03-{:02d}T12:00:00".format(day))]
+
+		# Record merges into this constellation, as SNAC does
+		merged = self.mergesByTarget.get(i, [])
+		if len(merged) > 0:
+			description = json.dumps({"action": "merge",
+				"icids": [self.outdatedID(k) for k in merged],
+				"arks": [self.outdatedArk(k) for k in merged]}, indent=4)
+			events.append(event("revised", "2021-01-25T10:46:10",
+				description))
+		return events
+
+	def _biogHist(self, i):
+		"""Build a biogHist of self.paragraphs paragraphs"""
+		paragraph = "<p xmlns=\"urn:isbn:1-931666-33-4\">" + self.name(i)
+		paragraph += ". " + LOREM + "</p>"
+		return "<biogHist>" + paragraph * self.paragraphs + "</biogHist>"
+
+	def _places(self, i, rng, item):
+		"""Build a constellation's places, with birth & death for persons"""
+		roles = ["AssociatedPlace"]
+		if self.entityType(i) == PERSON:
+			roles = ["Birth", "Death"] + roles[:rng.randint(0, 1)]
+
+		places = []
+		for role in roles:
+			name, latitude, longitude, countryCode = rng.choice(PLACES)
+			places.append(item("Place", original=name,
+				type=term("705", "AssociatedPlace", "place_type", True),
+				role=term("400238" if role == "Birth" else "400239", role,
+					"place_role"),
+				geoplace={"dataType": "GeoTerm", "name": name,
+					"latitude": latitude, "longitude": longitude,
+					"countryCode": countryCode}))
+		return places
+
+	def _dates(self, i, item):
+		"""Build a constellation's existence dates"""
+		born, died = (str(year) for year in self.lifespan(i))
+		fromDate, toDate = born + "-01-01", died + "-12-31"
+		return item("SNACDate", fromDate=fromDate, fromDateOriginal=born,
+			fromType=term("689", "Birth", "date_type", True), toDate=toDate,
+			toDateOriginal=died, toType=term("690", "Death", "date_type",
+			True), isRange=True)
+
+	def iterConstellations(self):
+		"""Yield every constellation, in order"""
+		for i in range(self.count):
+			yield self.constellation(i)
+
+	def writeFiles(self, directory):
+		"""
+		Write every constellation to a JSON file, plus idsToUpdate.tsv
+
+		@param: directory, str, the folder to write to (created if need be)
+		@return: the number of files written
+		"""
+		os.makedirs(directory, exist_ok=True)
+		written = 0
+		for constellation in self.iterConstellations():
+			filename = os.path.join(directory,
+				constellation["ark"][-8:] + ".json")
+			text = json.dumps(constellation, ensure_ascii=False, indent=4)
+			with open(filename, "w", encoding="utf-8") as f:
+				f.write(text)
+			written += 1
+			if written % 1000 == 0:
+				print("Wrote", written, "constellations...", end="\r")
+
+		self.writeIdsToUpdate(os.path.join(directory, "idsToUpdate.tsv"))
+		return written
+
+	def writeIdsToUpdate(self, filename):
+		"""Write the merged IDs as a TSV in the form getUpdatedIds writes"""
+		rows = ["\t".join(["Old ID", "New ID", "Old Ark", "New Ark"])]
+		for k, target in self.merges:
+			rows.append("\t".join([self.outdatedID(k), self.snacID(target),
+				self.outdatedArk(k), self.ark(target)]))
+		with open(filename, "w", encoding="utf-8") as f:
+			f.write("\n".join(rows) + "\n")
+
+def term(termId, name, type, withUri=False):
+	"""Build a SNAC controlled-vocabulary term"""
+	entry = {"id": termId, "term": name}
+	if withUri:
+		entry["uri"] = TERM_URL + name
+	entry["type"] = type
+	return entry
+
+def language():
+	"""Return the fields of an English/Latin-script Language component"""
+	return {
+		"language": {"id": "130", "term": "eng", "type": "language_code",
+			"description": "English"},
+		"script": {"id": "586", "term": "Latn", "type": "script_code",
+			"description": "Latin"}
+	}
+
+def main():
+	parser = argparse.ArgumentParser()
+	msg = "number of constellations to generate"
+	parser.add_argument("--count", type=int, default=1000, help=msg)
+	msg = "folder to write the constellations to"
+	parser.add_argument("--output", default="synthetic_jsons", help=msg)
+	msg = "random seed (the same seed gives the same data set)"
+	parser.add_argument("--seed", type=int, default=0, help=msg)
+	msg = "average number of relations each constellation starts with"
+	parser.add_argument("--mean-degree", type=float, default=5.0, help=msg)
+	msg = "how relation counts are distributed"
+	parser.add_argument("--degree", choices=["uniform", "powerlaw"],
+		default="powerlaw", help=msg)
+	msg = "power-law exponent (lower means a heavier tail)"
+	parser.add_argument("--alpha", type=float, default=2.0, help=msg)
+	msg = "share of relations whose inverse is also recorded"
+	parser.add_argument("--reciprocal-rate", type=float, default=0.5, help=msg)
+	msg = "share of relations pointing at a merged (outdated) ID"
+	parser.add_argument("--outdated-rate", type=float, default=0.02, help=msg)
+	msg = "share of constellations with a duplicated subject"
+	parser.add_argument("--duplicate-subject-rate", type=float, default=0.05,
+		help=msg)
+	msg = "size of each biogHist, in paragraphs"
+	parser.add_argument("--paragraphs", type=int, default=1, help=msg)
+	args = parser.parse_args()
+
+	print("\nPlanning", args.count, "constellations...")
+	start = time.perf_counter()
+	generator = ConstellationGenerator(args.count, args.seed, args.mean_degree,
+		args.degree, args.alpha, args.reciprocal_rate, args.outdated_rate,
+		args.duplicate_subject_rate, args.paragraphs)
+
+	written = generator.writeFiles(args.output)
+	seconds = time.perf_counter() - start
+
+	numRelations = sum(len(relations) for relations in generator.relations)
+	maxDegree = max([len(relations) for relations in generator.relations],
+		default=0)
+	msg = "\nWrote {} constellations ({} relations, at most {} on one; "
+	msg += "{} outdated IDs) to {} in {:.1f}s.\n"
+	print(msg.format(written, numRelations, maxDegree, len(generator.merges),
+		args.output, seconds))
+
+if __name__ == "__main__":
+	main()
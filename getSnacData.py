@@ -6,10 +6,20 @@ This script pulls in the list of constellations to include in the obf-site
 GitHub repo, extracts the SNAC IDs from that list, makes API calls to each of them,
 and writes the resulting JSONs to the `snac_jsons` folder.
 """
-import json, requests
-from sys import exc_info
+import json, os, argparse, queue, threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils import writeAtomically, openSnacStore, verifyApiSuccess
+from snacStore import SnacStore
+from snacClient import SnacClient, getClient
+import rateLimiter
+from downloadJournal import DownloadJournal, FETCHED, FAILED, PENDING
 
-def retrieveSnacAgent(snacID):
+SNAC_API_URL = "https://api.snaccooperative.org/"
+
+# Where refreshSnacAgents notes how up to date the downloaded files are
+WATERMARK_FILE = "refreshWatermark.txt"
+
+def retrieveSnacAgent(snacID, client=None, baseURL=SNAC_API_URL):
 	"""
 	Given a SNAC agent's ID number, pull its full JSON record from SNAC.
 
@@ -22,58 +32,111 @@ def retrieveSnacAgent(snacID):
 		"download_constellation", on the other hand, returns all of the data
 		needed to make an EAC file, neatly wrapped up in JSON format)
 	Param: @snacID, the SNAC ID of the agent in question
+	Param: @client, the SnacClient to call the API with (by default, the
+			shared client for baseURL)
+	Param: @baseURL, the URL of the SNAC REST API to call
 	Returns: snacConstellation, a SNAC agent JSON in dict form
 	"""
 	# Prep data for API request
-	baseURL = "https://api.snaccooperative.org/"
 	input = {"command": "read",
 	"constellationid": snacID}
-	toPost = json.dumps(input)
 
-	# Make API request
-	output = requests.post(baseURL, data=toPost)
-	snacConstellation = output.json()["constellation"]
+	# Make API request, over a pooled connection
+	if client is None:
+		client = getClient(baseURL)
+	output = client.call(input, method="POST")
+	verifyApiSuccess(output)
+	snacConstellation = output["constellation"]
 
 	return snacConstellation
 
-def getSnacAgentsFromList(snacIds):
+def fetchSnacAgents(snacIds, maxInFlight=8, baseURL=SNAC_API_URL):
 	"""
-	Given a list of snacIDs, return a list of constellation JSONs via API calls
+	Fetch constellations concurrently, yielding them as they arrive
+
+	At most maxInFlight requests are outstanding at once, all sharing one
+	pooled SnacClient. Results come back in completion order, not list order.
+	Failures are yielded rather than raised so one bad ID doesn't stop the rest.
+
+	Params: @snacIds, an iterable of SNAC IDs
+			@maxInFlight, the maximum number of simultaneous API requests
+			@baseURL, the URL of the SNAC REST API to call
+	Yields: tuples of the form (snacID, constellation, error), where
+			constellation is None on failure and error is None on success
+	"""
+	client = SnacClient(baseURL, poolSize=maxInFlight)
+	pending = {}
+
+	with client, ThreadPoolExecutor(max_workers=maxInFlight) as executor:
+		# Keep the pool topped up with requests until we run out of IDs
+		for ID in snacIds:
+			future = executor.submit(retrieveSnacAgent, ID, client, baseURL)
+			pending[future] = ID
+			if len(pending) < maxInFlight:
+				continue
+
+			# The pool is full, so hand back whatever finishes first
+			done, notDone = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				yield _unpackFuture(pending.pop(future), future)
+
+		# Drain whatever is still in flight
+		while pending:
+			done, notDone = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				yield _unpackFuture(pending.pop(future), future)
+
+def _unpackFuture(snacID, future):
+	"""Turn a finished fetch into a (snacID, constellation, error) tuple"""
+	try:
+		return (snacID, future.result(), None)
+	except Exception as e:
+		return (snacID, None, e)
+
+def iterSnacAgentsFromList(snacIds, maxInFlight=8, baseURL=SNAC_API_URL):
+	"""
+	Given a list of snacIDs, yield constellation JSONs as the API returns them
+
+	Only the constellations currently in flight are held in memory, so this can
+	be fed straight into writeJsons to download any number of constellations.
 
 	Params: @snacIDs, a list containing SNAC IDs
-	Returns: snacConstellations, a list of SNAC agent JSONs in dict form
+			@maxInFlight, the maximum number of simultaneous API requests
+			@baseURL, the URL of the SNAC REST API to call
+	Yields: SNAC agent JSONs in dict form
+			(in the order they were received, not the order of snacIds)
 	"""
 	length = len(snacIds)
 	i = 0
 
-	# Pull full JSONs of listed constellations from SNAC into a list
-
-	snacConstellations = [] # Initialize list to return
-
 	print("Fetching {} constellations from SNAC...".format(length))
 
-	# Get constellation via API request
-	for ID in snacIds:
+	# Get constellations via concurrent API requests
+	for ID, agent, error in fetchSnacAgents(snacIds, maxInFlight, baseURL):
 		# Print a helpful message
 		i += 1
-		msg = "\rFetching constellation {:3d}, id {:9}...".format(i, ID)
+		msg = "\rFetched constellation {:3d}, id {:9}...".format(i, ID)
 		print(msg, end="")
 
-		try:
-			# Download constellation json
-			agent = retrieveSnacAgent(ID)
-			# Append constellation to list
-			snacConstellations.append(agent)
-		except Exception as e:
-			# print()
-			# raise e
+		if error is not None:
 			print("\nEncountered error with " + ID)
-			print(exc_info()[2])
+			print(error)
 			continue
 
+		yield agent
+
 	print("Successfully fetched all constellations!\r\r")
 
-	return snacConstellations
+def getSnacAgentsFromList(snacIds, maxInFlight=8):
+	"""
+	Given a list of snacIDs, return a list of constellation JSONs via API calls
+
+	Params: @snacIDs, a list containing SNAC IDs
+			@maxInFlight, the maximum number of simultaneous API requests
+	Returns: snacConstellations, a list of SNAC agent JSONs in dict form
+			 (in the order they were received, not the order of snacIds)
+	"""
+	return list(iterSnacAgentsFromList(snacIds, maxInFlight))
 
 def getIdList(url):
 	"""
@@ -83,8 +146,8 @@ def getIdList(url):
 	Returns: a list of ID strings
 	"""
 	# Get file contents from GitHub
-	response = requests.get(url)
-	file = response.text
+	with SnacClient(url) as client:
+		file = client.get().text
 
 	# Split file contents into rows
 	rows = file.split("\n")
@@ -106,82 +169,403 @@ def getIdList(url):
 		ids.append(id)
 	return ids
 
-def getRelatedSnacAgents(mainID):
+def getRelatedSnacAgents(mainID, depth=1, maxInFlight=8):
 	"""
 	Given a SNAC agent's ID number, pull the full JSON record of that
 	constellation and those of all related agents.
 
 	Param: @mainID, the SNAC ID of the central agent
+	Param: @depth, how many relationships away from the main agent to go
+	Param: @maxInFlight, the maximum number of simultaneous API requests
 	Returns: snacConstellations, a list of SNAC agent JSONs in dict form
+			 (the main constellation first)
 	"""
-
-	# Get main record from SNAC
-	print("\nRetrieving main constellation from SNAC...")
-	mainConstellation = retrieveSnacAgent(mainID)
-	print("Main constellation retrieved.\n\n")
-
-	# Extract list of related constellation ids from main record
-	snacIds = [mainConstellation["id"]]
-	for entry in mainConstellation["relations"]:
-		# Get the constellation ID
-		id = entry["targetConstellation"]
-		# Add the ID to the list
-		snacIds.append(id)
-	# Remove duplicate IDs
-	snacIds = list(set(snacIds))
-
-	numRelated = len(snacIds)
-
-	# Pull full JSONs of related constellations from SNAC into a list
-	snacConstellations = [mainConstellation] # Initialize list
-	print("Fetching {} related constellations from SNAC...".format(numRelated))
-	for i in range(numRelated): # Loop over list of IDs
-		# Print relevant message
-		print("\rFetching constellation {}...".format(i+1), end="")
-		# Get relevant ID
-		id = snacIds[i]
-		# Get constellation via API request
-		relConstellation = retrieveSnacAgent(id)
-		# Add retrieved constellation to list of constellations
-		snacConstellations.append(relConstellation)
+	snacConstellations = list(crawlSnacAgents([mainID], depth,
+		maxInFlight=maxInFlight))
 
 	print("\nRetrieved all constellations\n\n")
 
 	return snacConstellations
 
-def writeJsons(jsons):
+def loadStopList(filename="targetsToExclude.tsv"):
+	"""
+	Read the names of constellations a crawl shouldn't go through
+
+	Params: @filename, a TSV of the form name, flag; names flagged "1" (i.e.
+			only one relationship away, with no link to Hunt) are stopped at
+	Returns: a set of constellation names
+	"""
+	with open(filename, encoding="utf-8") as f:
+		rows = f.read().split("\n")
+
+	# Discard header row
+	del rows[0]
+
+	stopNames = set()
+	for row in rows:
+		fields = row.split("\t")
+		if len(fields) == 2 and fields[1] == "1":
+			stopNames.add(fields[0])
+	return stopNames
+
+def crawlSnacAgents(seedIds, depth=1, maxNodes=None, stopNames=frozenset(),
+	store=None, maxInFlight=8, baseURL=SNAC_API_URL):
+	"""
+	Walk the SNAC relationship graph outward from some constellations
+
+	The walk is breadth first: every constellation at one distance from the
+	seeds is fetched concurrently before moving on to the next. Each
+	constellation is only visited once, & constellations already in the local
+	store are expanded from there instead of being fetched again.
+
+	Params: @seedIds, a list of SNAC IDs to start from
+			@depth, how many relationships away from the seeds to go
+			@maxNodes, stop after visiting this many constellations (optional)
+			@stopNames, names of relationship targets not to follow (see
+			 loadStopList)
+			@store, a SnacStore of constellations not to fetch again (optional)
+			@maxInFlight, the maximum number of simultaneous API requests
+			@baseURL, the URL of the SNAC REST API to call
+	Yields: the SNAC agent JSONs fetched from SNAC, level by level
+			(constellations found in the store are not yielded)
 	"""
-	Given a list of JSON objects, write each one to a separate file
+	visited = set()
+	frontier = [str(ID) for ID in seedIds]
+
+	for hop in range(depth + 1):
+		# Drop repeats & anything already seen, then apply the node budget
+		frontier = [ID for ID in dict.fromkeys(frontier) if ID not in visited]
+		if maxNodes is not None:
+			frontier = frontier[:max(maxNodes - len(visited), 0)]
+		if len(frontier) == 0:
+			return
+		visited.update(frontier)
+
+		# Expand what we already have locally, & fetch the rest
+		nextFrontier = []
+		toFetch = []
+		for ID in frontier:
+			cached = None
+			if store is not None:
+				cached = store.get(ID, fields=["id", "relations"])
+			if cached is None:
+				toFetch.append(ID)
+			elif hop < depth:
+				nextFrontier += _relationTargets(cached, stopNames)
+
+		msg = "Level {}: {} constellations, fetching {} from SNAC..."
+		print(msg.format(hop, len(frontier), len(toFetch)))
+
+		for ID, agent, error in fetchSnacAgents(toFetch, maxInFlight, baseURL):
+			if error is not None:
+				print("Encountered error with " + ID)
+				print(error)
+				continue
+
+			# A merged constellation comes back under its new ID
+			visited.add(agent["id"])
+			if hop < depth:
+				nextFrontier += _relationTargets(agent, stopNames)
+			yield agent
+
+		frontier = nextFrontier
+
+def _relationTargets(constellation, stopNames):
+	"""List the targets of a constellation's relations, minus stopped ones"""
+	targets = []
+	for relation in constellation.get("relations", []):
+		if relation.get("content") in stopNames:
+			continue
+		targets.append(relation["targetConstellation"])
+	return targets
 
-	Param: jsons, a list of JSON objects represented as Python dicts
+def downloadSnacAgents(snacIds, journal, maxInFlight=8, maxAttempts=None,
+	directory="snac_jsons/", baseURL=SNAC_API_URL):
+	"""
+	Fetch constellations & write each one to file as soon as it arrives
+
+	Skips IDs the journal says are already on disk, and records the outcome for
+	every ID it tries, so an interrupted download can pick up where it left off.
+
+	Params: @snacIds, a list of SNAC IDs
+			@journal, a DownloadJournal recording each ID's state
+			@maxInFlight, the maximum number of simultaneous API requests
+			@maxAttempts, skip IDs that have already failed this many times
+			@directory, the folder to write the JSON files to
+			@baseURL, the URL of the SNAC REST API to call
+	Returns: a dict of the form {state: number of IDs in that state}
 	"""
-	print("Writing {} JSON objects to file...".format(len(jsons)))
+	toFetch = journal.idsToFetch(snacIds, maxAttempts)
+	skipped = len(snacIds) - len(toFetch)
+	if skipped > 0:
+		print("Skipping {} constellations already on disk.".format(skipped))
+
+	# Note everything we're about to fetch, in case we're interrupted
+	journal.recordMany(toFetch, PENDING)
+
+	# A complete, fresh download is current as of now (see refreshSnacAgents)
+	recent = listRecentlyPublished(baseURL) if skipped == 0 else None
+
+	print("Fetching {} constellations from SNAC...".format(len(toFetch)))
 
-	# Loop over JSONs
-	for item in jsons:
-		try:
-			# Create filename
-			directory = "snac_jsons/"
-			entName = item["ark"][-8:]
-			filename = directory+entName+".json"
+	i = 0
+	for ID, agent, error in fetchSnacAgents(toFetch, maxInFlight, baseURL):
+		# Print a helpful message
+		i += 1
+		msg = "\rFetched constellation {:3d}, id {:9}...".format(i, ID)
+		print(msg, end="")
 
-			# Write file
-			print("Writing {}".format(filename.split("/")[-1] + "..."), end="")
+		if error is None:
 			try:
-				with open(filename, 'w', encoding='utf-8') as f:
-					json.dump(item, f, ensure_ascii=False, indent=4)
-			except (FileNotFoundError):
-				with open(filename, 'x', encoding='utf-8') as f:
-					json.dump(item, f, ensure_ascii=False, indent=4)
-			print("\tDone.")
-		except Exception as e:
-			# print()
-			# raise e
-			print("\nFailed to write the following JSON:")
-			print(item)
-			#print(exc_info()[2])
+				filename = writeJson(agent, directory)
+				journal.record(ID, FETCHED, filename, newAttempt=True)
+				continue
+			except Exception as e:
+				error = e
+
+		print("\nEncountered error with " + ID)
+		print(error)
+		journal.record(ID, FAILED, repr(error), newAttempt=True)
+
+	counts = journal.countStates()
+	if counts[FAILED] == 0 and recent:
+		writeWatermark(max(version for ID, version in recent), directory)
+
+	msg = "\n{} constellations now on disk; {} failed.\n"
+	print(msg.format(counts[FETCHED], counts[FAILED]))
+	return counts
+
+def loadLocalVersions(directory="snac_jsons/"):
+	"""
+	Find the version of every constellation already downloaded
+
+	Versions come from the local constellation store, so only files that are
+	new or have changed since it was last synced are read.
+
+	Param: directory, the folder holding the constellation JSON files
+	Returns: a dict of the form {SNAC ID: (version, filename)}
+	"""
+	with SnacStore(os.path.join(directory, "snacStore.sqlite"),
+		directory) as store:
+		store.sync()
+		return store.versions()
+
+def listRecentlyPublished(baseURL=SNAC_API_URL):
+	"""
+	Ask SNAC which constellations have been published most recently
+
+	Uses the "recently_published" API command, which lists the latest
+	constellations in summary form (one call, however big our collection).
+
+	Param: @baseURL, the URL of the SNAC REST API to call
+	Returns: a list of tuples of the form (SNAC ID, version), or None if
+			 SNAC's answer couldn't be used
+	"""
+	try:
+		output = getClient(baseURL).call({"command": "recently_published"},
+			method="POST")
+		verifyApiSuccess(output)
+		return [(str(c["id"]), int(c["version"]))
+			for c in output["constellation"]]
+	except Exception as e:
+		# Whatever went wrong, checking every ID still works
+		print("Could not list recently published constellations:", repr(e))
+		return None
+
+def readWatermark(directory="snac_jsons/"):
+	"""Return the version the local files were last known current at"""
+	try:
+		with open(os.path.join(directory, WATERMARK_FILE)) as f:
+			return int(f.read().strip())
+	except (OSError, ValueError):
+		return None
+
+def writeWatermark(version, directory="snac_jsons/"):
+	"""Note that the local files are current as of a SNAC version"""
+	writeAtomically(os.path.join(directory, WATERMARK_FILE), str(version))
+
+def findChangedIds(snacIds, localVersions, recent, watermark):
+	"""
+	Work out which constellations need fetching, from SNAC's recent publishes
+
+	SNAC numbers versions from one sequence shared by every constellation, so
+	if the recently published list reaches back to the watermark (the newest
+	version SNAC had when our files were last brought up to date), every
+	constellation changed since then is on it.
+
+	Params: @snacIds, the list of SNAC IDs to keep up to date
+			@localVersions, a dict of the form {SNAC ID: (version, filename)}
+			@recent, a list of tuples of the form (SNAC ID, version), as
+			listRecentlyPublished returns
+			@watermark, int, the newest version at the last refresh
+	Returns: a list of the IDs that are new or have changed, in snacIds order,
+			 or None if the list doesn't reach back far enough to tell
+	"""
+	if recent is None or watermark is None or len(recent) == 0:
+		return None
+	# (Versions that were never published leave gaps in the list, so it only
+	#	certainly covers everything if it goes back past the watermark)
+	if min(version for ID, version in recent) > watermark:
+		return None
+
+	latest = {}
+	for ID, version in recent:
+		latest[ID] = max(version, latest.get(ID, version))
+
+	changed = []
+	for ID in snacIds:
+		local = localVersions.get(str(ID))
+		if local is None:
+			changed.append(ID)
+		elif str(ID) in latest and latest[str(ID)] > int(local[0]):
+			changed.append(ID)
+	return changed
+
+def refreshSnacAgents(snacIds, journal, maxInFlight=8, directory="snac_jsons/",
+	baseURL=SNAC_API_URL, checkAll=False):
+	"""
+	Bring the local constellation files up to date with SNAC
+
+	First asks SNAC which constellations were published recently (one call),
+	& compares that with the versions in the local store, so only
+	constellations that are new or whose version has moved are fetched. If
+	that list doesn't reach back to the last refresh (or checkAll is set),
+	every constellation is read instead, which also finds merges: when SNAC
+	answers with a different ID, the outdated file is replaced by the merged
+	constellation's file. Either way, only changed files are rewritten.
+
+	Params: @snacIds, a list of SNAC IDs
+			@journal, a DownloadJournal recording each ID's state
+			@maxInFlight, the maximum number of simultaneous API requests
+			@directory, the folder holding the constellation JSON files
+			@baseURL, the URL of the SNAC REST API to call
+			@checkAll, whether to read every constellation regardless
+	Returns: a dict counting "new", "changed", "unchanged" & "failed" IDs
+	"""
+	localVersions = loadLocalVersions(directory)
+	counts = {"new": 0, "changed": 0, "unchanged": 0, "failed": 0}
+
+	# Note how far SNAC has got before looking, so the next refresh can
+	#	pick up anything published while this one runs
+	recent = listRecentlyPublished(baseURL)
+	toFetch = None
+	if not checkAll:
+		toFetch = findChangedIds(snacIds, localVersions, recent,
+			readWatermark(directory))
+	if toFetch is None:
+		if not checkAll:
+			print("No record of recent changes reaching back to the last "
+				"refresh; checking every constellation.")
+		toFetch = snacIds
+	else:
+		counts["unchanged"] = len(snacIds) - len(toFetch)
+
+	print("Checking {} constellations for changes...".format(len(toFetch)))
+
+	i = 0
+	for ID, agent, error in fetchSnacAgents(toFetch, maxInFlight, baseURL):
+		# Print a helpful message
+		i += 1
+		msg = "\rChecked constellation {:3d}, id {:9}...".format(i, ID)
+		print(msg, end="")
+
+		if error is not None:
+			print("\nEncountered error with " + ID)
+			print(error)
+			journal.record(ID, FAILED, repr(error), newAttempt=True)
+			counts["failed"] += 1
 			continue
 
+		# Leave the file alone if SNAC's copy hasn't moved on from ours
+		local = localVersions.get(str(ID))
+		if local is not None:
+			localVersion, localFile = local
+			if agent["id"] == str(ID) and agent["version"] == localVersion:
+				counts["unchanged"] += 1
+				continue
+
+		filename = writeJson(agent, directory)
+		journal.record(ID, FETCHED, filename, newAttempt=True)
+
+		if local is None:
+			counts["new"] += 1
+		else:
+			counts["changed"] += 1
+			# A merged constellation has a new ark, & so a new filename
+			if os.path.abspath(localFile) != os.path.abspath(filename):
+				os.remove(localFile)
+
+	# Only move the watermark on once everything is known to be current
+	if counts["failed"] == 0 and recent:
+		writeWatermark(max(version for ID, version in recent), directory)
+
+	msg = "\n{new} new, {changed} changed, {unchanged} unchanged, "
+	msg += "{failed} failed.\n"
+	print(msg.format(**counts))
+	return counts
+
+def writeJson(item, directory="snac_jsons/"):
+	"""
+	Write a single constellation to its own file, named after its ark
+
+	Param: item, a SNAC constellation in dict form
+	Param: directory, the folder to write the file to
+	Returns: the name of the file written
+	"""
+	entName = item["ark"][-8:]
+	filename = os.path.join(directory, entName + ".json")
+
+	text = json.dumps(item, ensure_ascii=False, indent=4)
+	writeAtomically(filename, text)
+
+	return filename
+
+def writeJsons(jsons, directory="snac_jsons/", queueSize=8):
+	"""
+	Given JSON objects, write each one to a separate file as it arrives
+
+	Serializing & writing happen on a separate writer thread, so jsons can be
+	a generator that is still fetching (e.g. iterSnacAgentsFromList); at most
+	queueSize objects wait in memory to be written. Each file is written
+	atomically, so an interrupted run never leaves a half-written JSON behind.
+
+	Param: jsons, an iterable of JSON objects represented as Python dicts
+	Param: directory, the folder to write the files to
+	Param: queueSize, the most objects to hold while the writer catches up
+	Returns: the number of files written
+	"""
+	print("Writing JSON objects to file as they arrive...")
+
+	toWrite = queue.Queue(maxsize=queueSize)
+	written = [0] # A list, so the writer thread can update it
+
+	def writer():
+		while True:
+			item = toWrite.get()
+			if item is None: # No more JSONs are coming
+				return
+			try:
+				writeJson(item, directory)
+				written[0] += 1
+			except Exception as e:
+				print("\nFailed to write the following JSON:")
+				print(item)
+				print(e)
+
+	thread = threading.Thread(target=writer, daemon=True)
+	thread.start()
+
+	# Hand each JSON to the writer, blocking while its queue is full
+	try:
+		for item in jsons:
+			toWrite.put(item)
+	finally:
+		toWrite.put(None)
+		thread.join()
+
+	print("\nWrote {} JSON objects to file.".format(written[0]))
+	return written[0]
+
 def convertSnacToEac(snacConstellations):
 	"""
 	Converts a set of SNAC constellations into a set of EAC-CPF XML objects
@@ -251,16 +635,60 @@ def extractName(eac):
 		return part.text
 
 def main():
+	parser = argparse.ArgumentParser()
+	msg = "forget previous progress & fetch every constellation again"
+	parser.add_argument("--restart", action="store_true", help=msg)
+	msg = "skip constellations that have already failed this many times"
+	parser.add_argument("--max-attempts", type=int, default=None, help=msg)
+	msg = "maximum number of simultaneous API requests"
+	parser.add_argument("--in-flight", type=int, default=8, help=msg)
+	msg = "only rewrite constellations whose version has changed on SNAC"
+	parser.add_argument("--incremental", action="store_true", help=msg)
+	msg = "with --incremental, read every constellation to check it (slower, "
+	msg += "but also finds merged constellations)"
+	parser.add_argument("--check-all", action="store_true", help=msg)
+	msg = "instead of the inclusion list, crawl outward from these SNAC IDs"
+	parser.add_argument("--crawl", nargs="+", default=None, help=msg)
+	msg = "how many relationships away from the --crawl IDs to go"
+	parser.add_argument("--depth", type=int, default=1, help=msg)
+	msg = "stop crawling after visiting this many constellations"
+	parser.add_argument("--max-nodes", type=int, default=None, help=msg)
+	msg = "maximum read calls per second to SNAC (default {})"
+	msg = msg.format(rateLimiter.RATE_LIMITS[("prod", "read")][0])
+	parser.add_argument("--rate", type=float, default=None, help=msg)
+	args = parser.parse_args()
+
+	if args.rate is not None:
+		rateLimiter.setRateLimit("prod", "read", args.rate)
+
+	if args.crawl is not None:
+		# Only fetch constellations we don't already have, & write each one
+		#	to file as it arrives
+		with openSnacStore() as store:
+			agents = crawlSnacAgents(args.crawl, args.depth, args.max_nodes,
+				loadStopList(), store, args.in_flight)
+			writeJsons(agents)
+		rateLimiter.printStats()
+		return
+
 	huntID = 85290808
 	base = "https://raw.githubusercontent.com/swat-ds/obf-site/main"
 	url = base + "/content/constellationsForInclusion.tsv"
 
-	# Get data on agents from SNAC in JSON form
+	# Load the record of any previous, interrupted download
+	journal = DownloadJournal()
+	if args.restart:
+		journal.clear()
+
+	# Get data on agents from SNAC in JSON form, writing each to file
 	idList = getIdList(url)
-	snacConstellations = getSnacAgentsFromList(idList)
+	if args.incremental:
+		refreshSnacAgents(idList, journal, args.in_flight,
+			checkAll=args.check_all)
+	else:
+		downloadSnacAgents(idList, journal, args.in_flight, args.max_attempts)
 
-	# Write SNAC jsons to files
-	writeJsons(snacConstellations)
+	rateLimiter.printStats()
 
 
 if __name__ == '__main__':
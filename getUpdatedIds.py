@@ -11,10 +11,16 @@ November 2021.
 import re, json, requests, secret
 from glob import glob
 from utils import loadSnacData, apiError, postToApi, verifyApiSuccess, apiError
+from getSnacData import fetchSnacAgents
+from idRedirectCache import IdRedirectCache
+from rateLimiter import serverName
+import argparse
 
 import re, json, requests
 
 
+SNAC_API_URL = "https://api.snaccooperative.org/"
+
 def getUniqueIdentifiers(constellations):
 	"""
 	Extract unique SNAC IDs & Arks (full url) from a list of SNAC constellations
@@ -51,7 +57,8 @@ def getUniqueIdentifiers(constellations):
 	print("\nSuccessfully aggregated", len(identifiers), "identifiers.\n")
 	return identifiers
 
-def verifyIdsAreCurrent(identifiers):
+def verifyIdsAreCurrent(identifiers, maxInFlight=8, cache=None,
+	baseUrl=SNAC_API_URL):
 	"""
 	Compile list of outdated identifiers paired with their current forms
 
@@ -59,48 +66,67 @@ def verifyIdsAreCurrent(identifiers):
 	when given an outdated identifier, will return the correct constellation,
 	but with the current identifiers). Assumes that SNAC ID and Ark can't
 	change independently, i.e., that if one has changed, the other must have
-	also changed.
+	also changed. Up to maxInFlight calls are made at once, and identifiers
+	that can't be checked are reported rather than stopping the run. If given
+	a cache, only identifiers it has no valid entry for are checked, and the
+	results are added to it.
 
 	@param: identifiers, dict w/ SNAC ids as keys & corresp Arks as values
+	@param: maxInFlight, int, the maximum number of simultaneous API calls
+	@param: cache, an IdRedirectCache for the server being checked (optional)
+	@param: baseUrl, str, the API of the SNAC server to check against
 	@returns: list of lists, each of the form [oldId, newId, oldArk, newArk]
+			  (in the same order as identifiers)
 	"""
 	print("Checking that identifiers are up to date...")
-	# Initialize the list of lists we're going to return
-	idsToUpdate = []
-
-	# Loop over identifiers
+	# Initialize the dict of outdated identifiers, keyed by old ID
+	outdated = {}
+	failures = []
+
+	# Start from what the cache already knows
+	toCheck = list(identifiers)
+	if cache is not None:
+		for oldId, (newId, newArk) in cache.redirects(identifiers).items():
+			outdated[oldId] = [oldId, newId, identifiers[oldId], newArk]
+		toCheck = cache.idsToCheck(identifiers)
+		msg = "{} identifiers known from the cache; checking the other {}."
+		print(msg.format(len(identifiers) - len(toCheck), len(toCheck)))
+
+	# Check identifiers concurrently, handling the results as they arrive
 	counter = 0	# Keep track of how many identifiers we've checked
-	for currentId in identifiers:
-		# To keep preliminary testing quick:
-		# if counter > 4: break
-
+	checks = fetchSnacAgents(toCheck, maxInFlight, baseUrl)
+	for currentId, constellation, error in checks:
 		# Print helpful message:
 		counter += 1
 		print("Checking identifier", counter, "...", end="\r")
 
-		# Make API call using identifier
-		req = {"command": "read", "constellationid": currentId}
-		response = postToApi(req, "https://api.snaccooperative.org/")
-
-		# Raise an error if API call failed
-		verifyApiSuccess(response)
-
-		# Get constellation from API response
-		constellation = response["constellation"]
+		# Note any identifier we couldn't check, & move on
+		if error is not None:
+			print("\nCould not check identifier", currentId + ":", error)
+			failures.append(currentId)
+			continue
 
 		# Check identifiers from constellation against current ones
 		if constellation["id"] != currentId:
 			# If they don't match, add old & new SNAC Ids & Arks to the list
-			newEntry = [
+			outdated[currentId] = [
 				currentId, 				# Outdated ID
 				constellation["id"],	# Updated ID
 				identifiers[currentId],	# Outdated Ark
 				constellation["ark"]	# Updated Ark
 			]
-			idsToUpdate.append(newEntry)
+			if cache is not None:
+				cache.recordRedirect(currentId, constellation["id"],
+					constellation["ark"])
+		elif cache is not None:
+			cache.recordCurrent(currentId)
 
+	# Put the results back in a predictable order
+	idsToUpdate = [outdated[ID] for ID in identifiers if ID in outdated]
 
 	print("\nChecked identifiers. Found ", len(idsToUpdate), "out of date.\n")
+	if len(failures) > 0:
+		print(len(failures), "identifiers could not be checked.\n")
 	return idsToUpdate
 
 def writeDataToFile(idsToUpdate):
@@ -124,7 +150,19 @@ def writeDataToFile(idsToUpdate):
 
 	print("Data written successfully.\n")
 
-def main():
+def main(baseUrl=SNAC_API_URL):
+	"""
+	Find the outdated identifiers in snac_jsons & write them to a TSV
+
+	@param: baseUrl, str, the API of the SNAC server to check against
+	"""
+	parser = argparse.ArgumentParser()
+	msg = "days an identifier confirmed current is trusted without rechecking"
+	parser.add_argument("--ttl", type=float, default=7, help=msg)
+	msg = "ignore the cache & check every identifier again"
+	parser.add_argument("--refresh", action="store_true", help=msg)
+	args = parser.parse_args()
+
 	print()
 
 	# Load constellation data from JSON files
@@ -135,7 +173,13 @@ def main():
 
 	# Compile dicts of old IDs & Arks keyed to the updated versions
 	# (Use the API to read every ID & see if what's returned matches)
-	idsToUpdate = verifyIdsAreCurrent(identifiers)
+	# (Identifiers checked recently are taken from the redirect cache)
+	cache = IdRedirectCache(serverName(baseUrl),
+		currentTtl=args.ttl*24*60*60)
+	if args.refresh:
+		cache.entries = {}
+	idsToUpdate = verifyIdsAreCurrent(identifiers, cache=cache,
+		baseUrl=baseUrl)
 
 	# Write identifiers to a TSV
 	writeDataToFile(idsToUpdate)
@@ -0,0 +1,145 @@
+"""
+Remembers which SNAC identifiers have been checked, & what they redirect to.
+
+The cache is an append-only TSV (`idRedirectCache.tsv`) of the form server,
+ID, state, new ID, new ark, time checked. An ID is either "current" (SNAC
+returned the same ID when asked) or "redirect" (SNAC returned a merged
+constellation with a new ID & ark). The last line for a server & ID wins, so
+an interrupted run loses at most the line it was writing.
+
+Merges are rare, so an ID confirmed current recently is almost certainly still
+current; such IDs aren't checked again until their entry is older than the
+cache's TTL. A redirect is followed to the ID it points at, & on through any
+later merges, and is only trusted while the end of that chain is confirmed
+current: once that entry expires, the old ID is checked again, so a target
+that's since been merged itself is never reported. Deleting the file starts
+over.
+"""
+
+import os, time
+
+CURRENT = "current"
+REDIRECT = "redirect"
+
+class IdRedirectCache:
+	"""
+	The results of checking SNAC identifiers against one SNAC server
+
+	Attributes:
+		server: str, the server the entries apply to (e.g. "prod" or "dev")
+		filename: str, the TSV file the cache is kept in (shared by servers)
+		currentTtl: float, seconds a "current" entry stays valid
+		redirectTtl: float, seconds a "redirect" entry stays valid (None means
+			forever, since a merge can't be undone; the chain it starts must
+			still end at an ID confirmed current, though)
+		entries: dict of the form {ID: [state, new ID, new ark, time checked]}
+	"""
+
+	def __init__(self, server, filename="idRedirectCache.tsv",
+		currentTtl=7*24*60*60, redirectTtl=None):
+		self.server = server
+		self.filename = filename
+		self.currentTtl = currentTtl
+		self.redirectTtl = redirectTtl
+		self.entries = {}
+		self.load()
+
+	def load(self):
+		"""Read this server's entries from the cache file, if there is one"""
+		if not os.path.exists(self.filename):
+			return
+
+		with open(self.filename, encoding="utf-8") as f:
+			rows = f.read().split("\n")
+
+		# Discard header row
+		del rows[0]
+
+		for row in rows:
+			# Skip blank lines & any line cut short by a crash
+			fields = row.split("\t")
+			if len(fields) != 6 or fields[0] != self.server:
+				continue
+			server, snacID, state, newId, newArk, checked = fields
+			self.entries[snacID] = [state, newId, newArk, float(checked)]
+
+	def recordCurrent(self, snacID):
+		"""Note that SNAC says an ID is current"""
+		self._record(str(snacID), CURRENT, str(snacID), "")
+
+	def recordRedirect(self, snacID, newId, newArk):
+		"""Note that SNAC says an ID has been merged into another"""
+		self._record(str(snacID), REDIRECT, str(newId), newArk)
+
+		# SNAC only ever redirects to the current constellation
+		self.recordCurrent(newId)
+
+	def _record(self, snacID, state, newId, newArk):
+		"""Update an ID's entry, both in memory and on disk"""
+		checked = time.time()
+		self.entries[snacID] = [state, newId, newArk, checked]
+		line = "\t".join([self.server, snacID, state, newId, newArk,
+			"{:.0f}".format(checked)])
+
+		# Write a header row if this is a new cache
+		needsHeader = not os.path.exists(self.filename)
+		with open(self.filename, "a", encoding="utf-8") as f:
+			if needsHeader:
+				f.write("Server\tID\tState\tNew ID\tNew Ark\tChecked\n")
+			f.write(line + "\n")
+
+	def lookup(self, snacID):
+		"""
+		Return an ID's entry if it's still valid
+
+		@param: snacID, str, the SNAC ID to look up
+		@return: a list of the form [state, new ID, new ark], or None if the
+			ID is unknown or its entry has expired
+		"""
+		entry = self.entries.get(str(snacID))
+		if entry is None:
+			return None
+		state, newId, newArk, checked = entry
+		ttl = self.currentTtl if state == CURRENT else self.redirectTtl
+		if ttl is not None and time.time() - checked > ttl:
+			return None
+		return [state, newId, newArk]
+
+	def resolve(self, snacID):
+		"""
+		Follow an ID's redirects to the ID that's current now
+
+		@param: snacID, str, the SNAC ID to look up
+		@return: a list of the form [state, new ID, new ark], where new ID is
+			the end of the chain of redirects, or None if any link in the
+			chain (the current ID at its end included) is unknown or expired
+		"""
+		snacID = str(snacID)
+		state, newArk = CURRENT, ""
+		seen = set()
+		while snacID not in seen:
+			seen.add(snacID)
+			entry = self.lookup(snacID)
+			if entry is None:
+				return None
+			if entry[0] == CURRENT:
+				return [state, snacID, newArk]
+			state, snacID, newArk = entry
+		return None # A cycle of redirects can't be trusted
+
+	def idsToCheck(self, snacIds):
+		"""Filter a list of IDs down to those needing a check, in order"""
+		return [snacID for snacID in snacIds if self.resolve(snacID) is None]
+
+	def redirects(self, snacIds):
+		"""
+		Return the valid redirects for a list of IDs, followed to their ends
+
+		@return: a dict of the form {old ID: [current ID, current ark]}
+		"""
+		found = {}
+		for snacID in snacIds:
+			entry = self.resolve(snacID)
+			if entry is not None and entry[0] == REDIRECT:
+				found[snacID] = entry[1:]
+		return found
@@ -32,8 +32,9 @@ def writeTsvToFile(rows):
 			writer.writerow(row)
 
 def main():
-	# Import JSONs
-	constellations = loadSnacData()
+	# Import JSONs, keeping only the fields the TSV uses
+	fields = ["nameEntries", "entityType", "id", "biogHists"]
+	constellations = loadSnacData(fields=fields)
 
 	# Create list of TSV rows from JSONs
 	rows = convertToTsv(constellations)
@@ -0,0 +1,335 @@
+"""
+A local stand-in for the SNAC REST API, for benchmarking and offline testing.
+
+The server holds a set of constellations in memory and answers the commands
+the scripts use: "read", "edit" (check out), "update_constellation",
+"publish_constellation", "unlock_constellation" and "recently_published".
+Edits are checked the way SNAC checks them: a constellation must be checked
+out (by the same API key) before it's updated or published, & the version
+sent must be its current one. Updates apply each item's "operation" (insert,
+update or delete) and give the constellation a new version, numbered (like
+SNAC's) from one sequence shared by every constellation. Nothing is written
+back to disk.
+
+To make API code reproducibly testable without the real SNAC servers, the
+server can add an artificial delay to every request, fail a share of requests
+with 500 errors, and throttle clients with 429 responses (either a share of
+requests at random, or whenever they go over a set rate). Random faults are
+seeded, so a run can be repeated exactly.
+
+Run `python3 mockSnacServer.py` to serve the constellations in `snac_jsons` on
+http://localhost:8081/; point the scripts' base URL there to use it.
+"""
+
+import json, argparse, copy, random, threading, time
+from glob import glob
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# The list fields of a constellation whose items can be edited
+EDITABLE_FIELDS = ["nameEntries", "entityIDs", "activities", "biogHists",
+	"conventionDeclarations", "dates", "genders", "generalContexts",
+	"languagesUsed", "legalStatuses", "mandates", "nationalities",
+	"occupations", "otherRecordIDs", "places", "relations", "resourceRelations",
+	"sameAs", "sources", "structureOrGenealogies", "subjects"]
+
+class MockSnacServer(ThreadingHTTPServer):
+	"""
+	A threaded HTTP server holding a set of SNAC constellations
+
+	Attributes:
+		constellations: dict of the form {SNAC ID: constellation dict}
+		checkedOut: dict of the form {SNAC ID: API key it's checked out to}
+		latency: float, seconds to wait before answering each request
+		errorRate: float, the share of requests to fail with a 500 error
+		throttleRate: float, the share of requests to refuse with a 429
+		rateLimit: float, requests per second to allow before answering 429
+			(None for no limit)
+		retryAfter: float, seconds to ask throttled clients to wait
+		lastVersion: int, the highest version number given out so far
+		recentCount: int, how many constellations recently_published lists
+		requestCount: int, how many requests the server has answered
+		statusCounts: dict of the form {HTTP status: # responses}
+		commandCounts: dict of the form {command: # requests}
+	"""
+	daemon_threads = True
+	request_queue_size = 128
+
+	def __init__(self, constellations, latency=0.0, port=8081, errorRate=0.0,
+		throttleRate=0.0, rateLimit=None, retryAfter=1.0, seed=None):
+		super().__init__(("localhost", port), MockSnacHandler)
+		self.constellations = {c["id"]: c for c in constellations}
+		self.checkedOut = {}
+		self.latency = latency
+		self.errorRate = errorRate
+		self.throttleRate = throttleRate
+		self.rateLimit = rateLimit
+		self.retryAfter = retryAfter
+		self.random = random.Random(seed)
+		self.requestCount = 0
+		self.statusCounts = {}
+		self.commandCounts = {}
+		self.nextItemId = 1
+		self.lastVersion = max([int(c["version"]) for c in constellations],
+			default=0)
+		self.recentCount = 100
+		self.lock = threading.Lock()
+
+		# A token bucket for rateLimit, holding about a second's worth (but
+		#	always at least one request's worth, so limits under 1/s work)
+		self.capacity = max(rateLimit or 0.0, 1.0)
+		self.tokens = self.capacity
+		self.updated = time.monotonic()
+
+	@property
+	def url(self):
+		return "http://localhost:{}/".format(self.server_address[1])
+
+	def startInBackground(self):
+		"""Serve requests from a daemon thread & return the thread"""
+		thread = threading.Thread(target=self.serve_forever, daemon=True)
+		thread.start()
+		return thread
+
+	def injectFault(self):
+		"""
+		Decide whether to throttle or fail a request instead of answering it
+
+		@return: an HTTP status (429 or 500), or None to answer normally
+		"""
+		with self.lock:
+			if self.rateLimit is not None:
+				now = time.monotonic()
+				self.tokens = min(self.capacity,
+					self.tokens + (now - self.updated) * self.rateLimit)
+				self.updated = now
+				if self.tokens < 1:
+					return 429
+				self.tokens -= 1
+
+			roll = self.random.random()
+			if roll < self.throttleRate:
+				return 429
+			if roll < self.throttleRate + self.errorRate:
+				return 500
+		return None
+
+	def countResponse(self, command, status):
+		"""Keep track of the commands received & statuses sent"""
+		with self.lock:
+			self.requestCount += 1
+			self.commandCounts[command] = self.commandCounts.get(command, 0) + 1
+			self.statusCounts[status] = self.statusCounts.get(status, 0) + 1
+
+	def handleCommand(self, request):
+		"""
+		Work out the response to an API request
+
+		@param: request, dict, the JSON body of the API call
+		@return: response, dict, the JSON body to send back
+		"""
+		command = request.get("command")
+		handlers = {
+			"read": self.read,
+			"edit": self.checkOut,
+			"update_constellation": self.update,
+			"publish_constellation": self.release,
+			"unlock_constellation": self.release,
+			"recently_published": self.recentlyPublished,
+		}
+		if command not in handlers:
+			return error("Input Error", "Unknown command: " + str(command))
+
+		with self.lock:
+			return handlers[command](request)
+
+	def read(self, request):
+		snacID = str(request.get("constellationid"))
+		if snacID not in self.constellations:
+			return error("Input Error", "Constellation not found")
+		return {"constellation": copy.deepcopy(self.constellations[snacID])}
+
+	def recentlyPublished(self, request):
+		"""List the latest versions, newest first, in summary form"""
+		latest = sorted(self.constellations.values(),
+			key=lambda c: int(c["version"]), reverse=True)
+		summaries = [{"dataType": "Constellation", "id": c["id"],
+			"ark": c.get("ark"), "version": c["version"]}
+			for c in latest[:self.recentCount]]
+		return {"constellation": summaries}
+
+	def checkOut(self, request):
+		snacID = str(request.get("constellationid"))
+		if snacID not in self.constellations:
+			return error("Input Error", "Constellation not found")
+		holder = self.checkedOut.get(snacID)
+		if holder is not None and holder != request.get("apikey"):
+			return error("Permission Error",
+				"Constellation is checked out to another user")
+		self.checkedOut[snacID] = request.get("apikey")
+		return {"constellation": copy.deepcopy(self.constellations[snacID])}
+
+	def update(self, request):
+		miniConst, failure = self._checkEdit(request)
+		if failure is not None:
+			return failure
+
+		# Apply each item's operation to a copy, so a bad item changes nothing
+		constellation = copy.deepcopy(self.constellations[str(miniConst["id"])])
+		for field in EDITABLE_FIELDS:
+			for item in miniConst.get(field, []):
+				failure = self._applyOperation(constellation, field, item)
+				if failure is not None:
+					return failure
+
+		self.lastVersion += 1
+		constellation["version"] = str(self.lastVersion)
+		self.constellations[str(constellation["id"])] = constellation
+		return {"constellation": copy.deepcopy(constellation)}
+
+	def release(self, request):
+		"""Publish or unlock a constellation (both just release it here)"""
+		miniConst, failure = self._checkEdit(request)
+		if failure is not None:
+			return failure
+		del self.checkedOut[str(miniConst["id"])]
+		constellation = self.constellations[str(miniConst["id"])]
+		return {"constellation": copy.deepcopy(constellation)}
+
+	def _checkEdit(self, request):
+		"""
+		Make sure an edit is to a current version checked out to its sender
+
+		@return: a tuple of the form (constellation sent, error response or
+			None)
+		"""
+		miniConst = request.get("constellation")
+		if not isinstance(miniConst, dict) or "id" not in miniConst:
+			return miniConst, error("Input Error", "No constellation given")
+
+		snacID = str(miniConst["id"])
+		if snacID not in self.constellations:
+			return miniConst, error("Input Error", "Constellation not found")
+		if self.checkedOut.get(snacID) != request.get("apikey"):
+			return miniConst, error("Permission Error",
+				"Constellation is not checked out to this user")
+
+		current = str(self.constellations[snacID]["version"])
+		if str(miniConst.get("version")) != current:
+			msg = "Version " + str(miniConst.get("version"))
+			msg += " is out of date; the current version is " + current
+			return miniConst, error("Version Error", msg)
+
+		return miniConst, None
+
+	def _applyOperation(self, constellation, field, item):
+		"""Apply one item's insert, update or delete; return any error"""
+		item = dict(item)
+		operation = item.pop("operation", None)
+		items = constellation.setdefault(field, [])
+
+		if operation == "insert":
+			if "id" not in item:
+				item["id"] = str(self.nextItemId)
+				self.nextItemId += 1
+			items.append(item)
+			return None
+
+		if operation in ("update", "delete"):
+			for i in range(len(items)):
+				if items[i].get("id") == item.get("id"):
+					if operation == "update":
+						items[i] = item
+					else:
+						del items[i]
+					return None
+			msg = "No " + field + " item with ID " + str(item.get("id"))
+			return error("Input Error", msg)
+
+		# Items without an operation are left as they are
+		return None
+
+class MockSnacHandler(BaseHTTPRequestHandler):
+	"""Hands each HTTP request to the MockSnacServer that received it"""
+	protocol_version = "HTTP/1.1" # Allow keep-alive, like the real API
+	disable_nagle_algorithm = True
+
+	def do_POST(self):
+		length = int(self.headers.get("Content-Length", 0))
+		try:
+			request = json.loads(self.rfile.read(length))
+		except ValueError:
+			request = {}
+
+		time.sleep(self.server.latency)
+
+		headers = {}
+		status = self.server.injectFault()
+		if status == 429:
+			response = error("Rate Limit", "Too many requests")
+			headers["Retry-After"] = str(self.server.retryAfter)
+		elif status == 500:
+			response = error("Server Error", "Injected failure")
+		else:
+			status = 200
+			response = self.server.handleCommand(request)
+
+		self.server.countResponse(request.get("command"), status)
+
+		body = json.dumps(response).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		for name, value in headers.items():
+			self.send_header(name, value)
+		self.end_headers()
+		self.wfile.write(body)
+
+	# The SNAC API accepts both verbs
+	do_PUT = do_POST
+
+	def log_message(self, format, *args):
+		pass # Keep the console quiet
+
+def error(type, message):
+	"""Build an error response in the form the SNAC API uses"""
+	return {"error": {"type": type, "message": message}}
+
+def loadConstellations(folder="snac_jsons"):
+	"""Read every constellation JSON in a folder into a list of dicts"""
+	constellations = []
+	for filename in glob(folder + "/*.json"):
+		with open(filename) as f:
+			constellations.append(json.load(f))
+	return constellations
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--port", type=int, default=8081)
+	msg = "seconds to wait before answering each request"
+	parser.add_argument("--latency", type=float, default=0.0, help=msg)
+	msg = "share of requests (0 to 1) to fail with a 500 error"
+	parser.add_argument("--error-rate", type=float, default=0.0, help=msg)
+	msg = "share of requests (0 to 1) to refuse with a 429"
+	parser.add_argument("--throttle-rate", type=float, default=0.0, help=msg)
+	msg = "requests per second to allow before answering 429"
+	parser.add_argument("--rate-limit", type=float, help=msg)
+	msg = "seconds to ask throttled clients to wait (Retry-After)"
+	parser.add_argument("--retry-after", type=float, default=1.0, help=msg)
+	msg = "seed for the random faults, to make a run repeatable"
+	parser.add_argument("--seed", type=int, help=msg)
+	args = parser.parse_args()
+
+	constellations = loadConstellations()
+	server = MockSnacServer(constellations, args.latency, args.port,
+		args.error_rate, args.throttle_rate, args.rate_limit, args.retry_after,
+		args.seed)
+
+	print("Serving", len(constellations), "constellations at", server.url)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		print("\nShutting down.")
+		print("Responses by status:", server.statusCounts)
+
+if __name__ == "__main__":
+	main()
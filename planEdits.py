@@ -0,0 +1,357 @@
+"""
+Plans edits to SNAC constellations offline, then runs the plans.
+
+The editing scripts (addRelationsToSNAC.py, updateLinkIdsInSnac.py and
+removeDupSubjsInSnac.py) work out each edit from the live constellation they
+check out, so a constellation needing no change still costs a checkout, and
+nobody sees the edits before they're made. This script works out the same
+minimal constellations from the local copies in `snac_jsons` instead, and
+writes them to a plan file (JSON, sorted by SNAC ID, so plans can be reviewed
+& diffed). Running a plan checks each constellation out, makes sure SNAC's
+version is the one the plan was made from, and pushes the planned changes.
+
+Usage:
+	python3 planEdits.py relations missingRelationships.tsv -o plan.json
+	python3 planEdits.py links -o plan.json
+	python3 planEdits.py subjects -o plan.json
+	python3 planEdits.py all --links --subjects -o plan.json
+	python3 planEdits.py merge plan1.json plan2.json -o plan.json
+	python3 planEdits.py run plan.json [--batch N]
+
+A constellation needing several kinds of change (say, a reciprocal relation,
+an ID fix & a duplicate subject removal) gets them all in one minimal
+constellation with `all` or `merge`, so it's only checked out, updated &
+published once.
+
+Progress running a plan is journalled (in e.g. `planJournal.tsv` for
+`plan.json`), so a plan can be run in batches, or resumed after a crash.
+"""
+
+import argparse, json, os, time
+from utils import openSnacStore, loadRelationsFromFile, loadIdsToUpdate
+from utils import writeAtomically, apiError
+from editJournal import jobDigest
+from apiEditUtils import getUserInput, getEditJournal, makeEdits, getApiUrl
+import addRelationsToSNAC, updateLinkIdsInSnac, removeDupSubjsInSnac
+
+# The fields the builders need from each local constellation
+BASE_FIELDS = ["id", "ark", "version"]
+
+def planRelationInserts(relations, store):
+	"""
+	Plan the edits adding a set of relationships to their sources
+
+	@param: relations, a list of Relationship objects
+	@param: store, a SnacStore holding the local constellations
+	@return: a tuple of the form (list of planned edits, list of SNAC IDs
+		missing from the store)
+	"""
+	edits, missing = [], []
+	bySource = addRelationsToSNAC.splitBySource(relations)
+	for source, relationships in bySource.items():
+		constellation = store.get(source, BASE_FIELDS)
+		if constellation is None:
+			missing.append(source)
+			continue
+		build = addRelationsToSNAC.relationsBuilder(relationships)
+		miniConst = build(constellation)
+		edits.append(plannedEdit(constellation, miniConst))
+	return edits, missing
+
+def planLinkUpdates(idsToUpdate, store):
+	"""
+	Plan the edits pointing relationships at the current IDs of their targets
+
+	@param: idsToUpdate, a dict w/ entries of the form
+		outdatedId: {"newId":newId, "newArk":newArk} (see makeDict in
+		updateLinkIdsInSnac)
+	@param: store, a SnacStore holding the local constellations
+	@return: a tuple of the form (list of planned edits, list of SNAC IDs
+		missing from the store)
+	"""
+	edits, missing = [], []
+	updateDict = updateLinkIdsInSnac.compileEditList(idsToUpdate)
+	for snacID, updates in updateDict.items():
+		constellation = store.get(snacID, BASE_FIELDS + ["relations"])
+		if constellation is None:
+			missing.append(snacID)
+			continue
+		miniConst = updateLinkIdsInSnac.buildMinimalUpdateConstellation(
+			constellation, updates)
+		if len(miniConst["relations"]) > 0:
+			edits.append(plannedEdit(constellation, miniConst))
+	return edits, missing
+
+def planSubjectDeletes(store):
+	"""
+	Plan the edits removing duplicate subjects from constellations
+
+	@param: store, a SnacStore holding the local constellations
+	@return: a tuple of the form (list of planned edits, list of SNAC IDs
+		missing from the store), the latter always empty
+	"""
+	fields = BASE_FIELDS + ["subjects"]
+	constellations = store.iterConstellations(hasField="subjects",
+		fields=fields)
+
+	edits = []
+	for constellation in constellations:
+		editList = removeDupSubjsInSnac.compileEditList([constellation])
+		subjIds = editList.get(constellation["id"])
+		if subjIds:
+			miniConst = removeDupSubjsInSnac.buildMinimalUpdateConstellation(
+				constellation, subjIds)
+			edits.append(plannedEdit(constellation, miniConst))
+	return edits, []
+
+def plannedEdit(constellation, miniConst):
+	"""Return a plan entry for one constellation's minimal update"""
+	return {
+		"id": str(constellation["id"]),
+		"version": str(constellation["version"]),
+		"constellation": miniConst
+	}
+
+def mergeMiniConstellations(miniConsts):
+	"""
+	Combine several minimal constellations for one constellation into one
+
+	List fields (e.g. "relations", "subjects") are concatenated, leaving out
+	any operation that appears more than once; other fields (id, ark, version)
+	are taken from the first.
+
+	@param: miniConsts, list of minimal constellations in dict form
+	@return: a minimal constellation in dict form
+	"""
+	merged = {}
+	seen = {}
+	for miniConst in miniConsts:
+		for key, value in miniConst.items():
+			if not isinstance(value, list):
+				merged.setdefault(key, value)
+				continue
+			merged.setdefault(key, [])
+			seen.setdefault(key, set())
+			for item in value:
+				signature = json.dumps(item, sort_keys=True)
+				if signature not in seen[key]:
+					seen[key].add(signature)
+					merged[key].append(item)
+	return merged
+
+def mergeEdits(editLists):
+	"""
+	Merge several lists of planned edits into one edit per constellation
+
+	Edits to the same constellation are only merged if they were planned from
+	the same version of it; otherwise they're left out & reported.
+
+	@param: editLists, list of lists of planned edits (see plannedEdit)
+	@return: a tuple of the form (list of merged edits, list of SNAC IDs
+		whose edits were planned from different versions)
+	"""
+	byId = {}
+	for edits in editLists:
+		for edit in edits:
+			byId.setdefault(edit["id"], []).append(edit)
+
+	merged, conflicts = [], []
+	for snacID, edits in byId.items():
+		if len({edit["version"] for edit in edits}) > 1:
+			conflicts.append(snacID)
+			continue
+		miniConst = mergeMiniConstellations([e["constellation"] for e in edits])
+		merged.append({
+			"id": snacID,
+			"version": edits[0]["version"],
+			"constellation": miniConst
+		})
+	return merged, conflicts
+
+def writePlan(filename, workflow, edits):
+	"""
+	Write a plan to a JSON file, one entry per constellation in SNAC ID order
+
+	@param: filename, str, the plan file to (over)write
+	@param: workflow, str, which kind of edit this is (e.g. "relations")
+	@param: edits, list of planned edits (see plannedEdit)
+	"""
+	edits = sorted(edits, key=lambda edit: int(edit["id"]))
+	plan = {
+		"workflow": workflow,
+		"created": time.strftime("%Y-%m-%d %H:%M:%S"),
+		"edits": edits
+	}
+	text = json.dumps(plan, ensure_ascii=False, indent=4, sort_keys=True)
+	writeAtomically(filename, text + "\n")
+
+def loadPlan(filename):
+	"""Read a plan file back into dict form"""
+	with open(filename, encoding="utf-8") as f:
+		return json.load(f)
+
+def planBuilder(edit):
+	"""
+	Return a function handing over a planned edit, if it's still current
+
+	@param: edit, dict, one planned edit (see plannedEdit)
+	@return: a function taking a checked-out constellation (see
+		apiEditUtils.editConstellation)
+	"""
+	def build(constellation):
+		# If the constellation has changed since we planned, don't push a
+		# plan based on old data
+		version = str(constellation["version"])
+		if version != edit["version"]:
+			msg = "\nPlan for " + edit["id"] + " is out of date: it was made "
+			msg += "from version " + edit["version"] + ", but SNAC has version "
+			msg += version + ". Download it again & replan."
+			raise apiError(msg)
+		return dict(edit["constellation"], version=constellation["version"])
+
+	return build
+
+def journalName(planFile):
+	"""Return the journal file that goes with a plan file"""
+	return os.path.splitext(planFile)[0] + "Journal.tsv"
+
+def runPlan(plan, apiKey, production, journal, maxInFlight=4, batch=None):
+	"""
+	Make the edits in a plan, skipping those the journal says are done
+
+	@param: plan, dict, a plan loaded with loadPlan
+	@param: apiKey, str, user API key to authenticate the modifications
+	@param: production, bool, whether to use production or development server
+	@param: journal, an EditJournal to record (& resume) progress in
+	@param: maxInFlight, int, the most constellations to edit at once
+	@param: batch, int, only make (at most) this many of the remaining edits
+	@return: a list of EditOutcome objects
+	"""
+	remaining = [edit for edit in plan["edits"] if
+		not journal.isDone(edit["id"], jobDigest(edit["constellation"]))]
+	if batch is not None:
+		remaining = remaining[:batch]
+
+	msg = "Making {} of the {} planned edits ({})..."
+	print(msg.format(len(remaining), len(plan["edits"]), plan["workflow"]))
+
+	jobs = [(edit["id"], planBuilder(edit), edit["constellation"])
+		for edit in remaining]
+	return makeEdits(jobs, apiKey, getApiUrl(production), maxInFlight, journal)
+
+def main():
+	parser = argparse.ArgumentParser()
+	subparsers = parser.add_subparsers(dest="action", required=True)
+
+	msg = "plan adding the relationships in a TSV file"
+	relations = subparsers.add_parser("relations", help=msg)
+	msg = "TSV file with 3 columns (source, type, & target)"
+	relations.add_argument("filename", help=msg)
+
+	msg = "plan updating outdated IDs, as listed in idsToUpdate.tsv"
+	links = subparsers.add_parser("links", help=msg)
+
+	msg = "plan removing duplicate subjects"
+	subjects = subparsers.add_parser("subjects", help=msg)
+
+	msg = "plan several kinds of edit at once, one edit per constellation"
+	combined = subparsers.add_parser("all", help=msg)
+	msg = "plan adding the relationships in this TSV file"
+	combined.add_argument("--relations", metavar="FILENAME", help=msg)
+	msg = "plan updating outdated IDs, as listed in idsToUpdate.tsv"
+	combined.add_argument("--links", action="store_true", help=msg)
+	msg = "plan removing duplicate subjects"
+	combined.add_argument("--subjects", action="store_true", help=msg)
+
+	msg = "merge plan files into one, with one edit per constellation"
+	merge = subparsers.add_parser("merge", help=msg)
+	merge.add_argument("plans", nargs="+", help="the plan files to merge")
+
+	for subparser in (relations, links, subjects, combined, merge):
+		msg = "the plan file to write"
+		subparser.add_argument("-o", "--output", default="plan.json", help=msg)
+
+	msg = "make the edits in a plan file"
+	run = subparsers.add_parser("run", help=msg)
+	run.add_argument("plan", help="the plan file to run")
+	msg = "only make this many of the plan's remaining edits"
+	run.add_argument("--batch", type=int, help=msg)
+	msg = "the most constellations to edit at once"
+	run.add_argument("--in-flight", type=int, default=4, help=msg)
+	msg = "ignore the journal of earlier runs and make every edit"
+	run.add_argument("--restart", action="store_true", help=msg)
+
+	args = parser.parse_args()
+	print()
+
+	if args.action == "run":
+		# API keys are only needed to make edits, not to plan them
+		import secret
+
+		plan = loadPlan(args.plan)
+		production = getUserInput()
+		apiKey = secret.prodKey if production else secret.devKey
+		journal = getEditJournal(journalName(args.plan), production,
+			args.restart)
+		runPlan(plan, apiKey, production, journal, args.in_flight, args.batch)
+		return
+
+	# Work out which kinds of edit to plan
+	if args.action == "all":
+		workflows = []
+		if args.relations is not None:
+			workflows.append("relations")
+			args.filename = args.relations
+		if args.links:
+			workflows.append("links")
+		if args.subjects:
+			workflows.append("subjects")
+		if len(workflows) == 0:
+			parser.error("all: give at least one of --relations, --links "
+				"or --subjects")
+	elif args.action != "merge":
+		workflows = [args.action]
+
+	editLists, missing = [], []
+	if args.action == "merge":
+		plans = [loadPlan(filename) for filename in args.plans]
+		workflows = [plan["workflow"] for plan in plans]
+		editLists = [plan["edits"] for plan in plans]
+	else:
+		with openSnacStore() as store:
+			for workflow in workflows:
+				if workflow == "relations":
+					relations = loadRelationsFromFile(args.filename)
+					edits, notFound = planRelationInserts(relations, store)
+				elif workflow == "links":
+					idsToUpdate = updateLinkIdsInSnac.makeDict(
+						loadIdsToUpdate())
+					edits, notFound = planLinkUpdates(idsToUpdate, store)
+				else:
+					edits, notFound = planSubjectDeletes(store)
+				editLists.append(edits)
+				missing += notFound
+
+	# Give each constellation a single edit, however many changes it needs
+	edits, conflicts = mergeEdits(editLists)
+	planned = sum(len(editList) for editList in editLists)
+	planned -= len([edit for editList in editLists for edit in editList
+		if edit["id"] in conflicts])
+
+	writePlan(args.output, "+".join(workflows), edits)
+	print("Planned edits to", len(edits), "constellations in", args.output)
+	if planned > len(edits):
+		msg = "(Merged {} separate edits, saving {} edit cycles.)"
+		print(msg.format(planned, planned - len(edits)))
+	if len(missing) > 0:
+		msg = "Couldn't plan edits to {} constellations not in snac_jsons: {}"
+		print(msg.format(len(missing), ", ".join(map(str, missing))))
+	if len(conflicts) > 0:
+		msg = "Left out {} constellations whose edits were planned from "
+		msg += "different versions: {}"
+		print(msg.format(len(conflicts), ", ".join(conflicts)))
+	print()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,144 @@
+"""
+Client-side rate limiting for calls to the SNAC API.
+
+Each (server, command class) pair, e.g. ("prod", "edit"), gets one shared
+token bucket, so every thread & asyncio task talking to that server draws from
+the same allowance. SnacClient takes a token before each request it sends,
+including retries. Buckets keep track of how long callers have had to wait, so
+the limits can be tuned to the fastest rate SNAC tolerates.
+
+Calls to servers with no configured limit (e.g. a local mockSnacServer) are
+not paced at all.
+"""
+
+import asyncio, threading, time
+from urllib.parse import urlparse
+
+# Default limits, as {(server, command class): (calls per second, burst size)}
+RATE_LIMITS = {
+	("prod", "read"): (10.0, 10),
+	("prod", "edit"): (2.0, 2),
+	("dev", "read"): (5.0, 5),
+	("dev", "edit"): (2.0, 2),
+}
+
+# Which server each SNAC API host belongs to
+SERVERS = {
+	"api.snaccooperative.org": "prod",
+	"snac-dev.iath.virginia.edu": "dev",
+}
+
+class TokenBucket:
+	"""
+	A thread-safe token bucket, usable from threads & asyncio tasks alike
+
+	Tokens refill continuously at rate per second, up to burst. Taking a token
+	when none are left reserves the next one to arrive & waits for it, so
+	callers are served in the order they asked.
+
+	Attributes:
+		rate: float, tokens added per second
+		burst: int, the most tokens the bucket can hold
+		calls: int, how many tokens have been taken
+		waits: int, how many of those calls had to wait
+		totalWait: float, seconds spent waiting, summed over all calls
+		maxWait: float, the longest any one call has waited
+	"""
+
+	def __init__(self, rate, burst=1):
+		self.rate = rate
+		self.burst = burst
+		self.tokens = float(burst)
+		self.updated = time.monotonic()
+		self.lock = threading.Lock()
+		self.calls = 0
+		self.waits = 0
+		self.totalWait = 0.0
+		self.maxWait = 0.0
+
+	def reserve(self):
+		"""Take a token & return how many seconds to wait before using it"""
+		with self.lock:
+			now = time.monotonic()
+			self.tokens = min(self.burst,
+				self.tokens + (now - self.updated) * self.rate)
+			self.updated = now
+
+			self.tokens -= 1
+			wait = max(0.0, -self.tokens / self.rate)
+
+			self.calls += 1
+			if wait > 0:
+				self.waits += 1
+				self.totalWait += wait
+				self.maxWait = max(self.maxWait, wait)
+			return wait
+
+	def acquire(self):
+		"""Block the calling thread until a token is available"""
+		wait = self.reserve()
+		if wait > 0:
+			time.sleep(wait)
+
+	async def acquireAsync(self):
+		"""Wait (without blocking the event loop) until a token is available"""
+		wait = self.reserve()
+		if wait > 0:
+			await asyncio.sleep(wait)
+
+	def stats(self):
+		"""Return a dict of the bucket's wait-time metrics"""
+		return {"calls": self.calls, "waits": self.waits,
+			"totalWait": self.totalWait, "maxWait": self.maxWait}
+
+_buckets = {}
+_bucketsLock = threading.Lock()
+
+def serverName(baseUrl):
+	"""Return "prod" or "dev" for a SNAC API URL, or its host for others"""
+	host = urlparse(baseUrl).hostname or baseUrl
+	return SERVERS.get(host, host)
+
+def getLimiter(baseUrl, commandClass):
+	"""
+	Return the shared token bucket for a server & command class
+
+	@param: baseUrl, str, the URL of the SNAC REST API being called
+	@param: commandClass, str, "read" or "edit"
+	@return: a TokenBucket, or None if calls to this server aren't limited
+	"""
+	key = (serverName(baseUrl), commandClass)
+	with _bucketsLock:
+		if key not in _buckets:
+			if key not in RATE_LIMITS:
+				return None
+			_buckets[key] = TokenBucket(*RATE_LIMITS[key])
+		return _buckets[key]
+
+def setRateLimit(server, commandClass, rate, burst=None):
+	"""
+	Change (or add) the limit for a server & command class
+
+	@param: server, str, "prod", "dev", or the host name of another server
+	@param: commandClass, str, "read" or "edit"
+	@param: rate, float, calls per second; None removes the limit
+	@param: burst, int, calls allowed back to back (by default, about 1s worth)
+	"""
+	key = (server, commandClass)
+	with _bucketsLock:
+		_buckets.pop(key, None)
+		if rate is None:
+			RATE_LIMITS.pop(key, None)
+		else:
+			RATE_LIMITS[key] = (rate, burst or max(1, int(rate)))
+
+def printStats():
+	"""Print the wait-time metrics of every bucket that's been used"""
+	with _bucketsLock:
+		buckets = sorted(_buckets.items())
+	for (server, commandClass), bucket in buckets:
+		stats = bucket.stats()
+		msg = "Rate limit {}/{}: {} calls, {} waited, "
+		msg += "{:.1f}s waiting in total, longest wait {:.2f}s"
+		print(msg.format(server, commandClass, stats["calls"], stats["waits"],
+			stats["totalWait"], stats["maxWait"]))
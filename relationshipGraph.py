@@ -0,0 +1,282 @@
+"""
+A compact, array-backed graph of the relationships between constellations.
+
+SNAC IDs and relationship types are interned to integers, and edges are kept
+in compressed sparse row (CSR) form: for each constellation, its outgoing
+edges sit in one contiguous run of a few flat arrays, sorted by target, with a
+second copy of the arrays for incoming edges. Neighbour lookups are then a
+slice of an array rather than a walk over Relationship objects, & a graph of a
+million edges takes tens of megabytes rather than hundreds.
+
+Build one from the local constellation store with
+`RelationshipGraph.fromStore(store)`, or from any list of Relationship objects
+with `RelationshipGraph.fromRelationships(relations)`.
+"""
+
+from array import array
+from bisect import bisect_left
+from utils import Relationship
+
+class RelationshipGraph:
+	"""
+	A directed multigraph of typed relationships between SNAC constellations
+
+	Duplicate edges (same source, type & target) are only stored once.
+
+	Attributes:
+		ids: list of SNAC IDs, indexed by node number
+		idCodes: dict of the form {SNAC ID: node number}
+		types: list of relationship types, indexed by type number
+		typeCodes: dict of the form {relationship type: type number}
+		outOffsets, outTargets, outTypes: arrays holding the outgoing edges;
+			node n's edges are at outOffsets[n] up to outOffsets[n+1]
+		inOffsets, inSources, inTypes: the same, for incoming edges
+	"""
+
+	def __init__(self, triples=()):
+		self.ids = []
+		self.idCodes = {}
+		self.types = []
+		self.typeCodes = {}
+
+		# Collect the edges as flat arrays of codes, not per-edge objects
+		sources, types, targets = array("i"), array("i"), array("i")
+		for source, type, target in triples:
+			sources.append(self._code(source, self.ids, self.idCodes))
+			types.append(self._code(type, self.types, self.typeCodes))
+			targets.append(self._code(target, self.ids, self.idCodes))
+
+		self.outOffsets, self.outTargets, self.outTypes = self._compress(
+			sources, types, targets)
+		self.inOffsets, self.inSources, self.inTypes = self._compress(
+			targets, types, sources)
+
+	@classmethod
+	def fromRelationships(cls, relations):
+		"""Build a graph from an iterable of Relationship objects"""
+		return cls((r.source, r.type, r.target) for r in relations)
+
+	@classmethod
+	def fromStore(cls, store):
+		"""Build a graph from the relations table of a SnacStore"""
+		return cls(store.iterRelations())
+
+	def __len__(self):
+		"""Return the number of edges in the graph"""
+		return len(self.outTargets)
+
+	def __contains__(self, snacID):
+		return str(snacID) in self.idCodes
+
+	def nbytes(self):
+		"""Return the memory taken up by the edge arrays, in bytes"""
+		arrays = [self.outOffsets, self.outTargets, self.outTypes,
+			self.inOffsets, self.inSources, self.inTypes]
+		return sum(a.itemsize * len(a) for a in arrays)
+
+	def outNeighbours(self, snacID, type=None):
+		"""
+		Return the IDs of the constellations a constellation relates to
+
+		@param: snacID, str, the constellation's SNAC ID
+		@param: type, str, only follow relationships of this type
+		@return: a list of SNAC IDs, sorted by node number & without repeats
+		"""
+		return self._neighbours(snacID, type, self.outOffsets, self.outTargets,
+			self.outTypes)
+
+	def inNeighbours(self, snacID, type=None):
+		"""Return the IDs of the constellations that relate to a constellation"""
+		return self._neighbours(snacID, type, self.inOffsets, self.inSources,
+			self.inTypes)
+
+	def outDegree(self, snacID):
+		"""Return the number of relationships a constellation has"""
+		node = self.idCodes.get(str(snacID))
+		if node is None:
+			return 0
+		return self.outOffsets[node + 1] - self.outOffsets[node]
+
+	def inDegree(self, snacID):
+		"""Return the number of relationships pointing at a constellation"""
+		node = self.idCodes.get(str(snacID))
+		if node is None:
+			return 0
+		return self.inOffsets[node + 1] - self.inOffsets[node]
+
+	def degree(self, snacID):
+		"""Return the number of relationships to or from a constellation"""
+		return self.outDegree(snacID) + self.inDegree(snacID)
+
+	def hasEdge(self, source, type, target):
+		"""Return whether the graph has a given relationship"""
+		sourceNode = self.idCodes.get(str(source))
+		targetNode = self.idCodes.get(str(target))
+		typeCode = self.typeCodes.get(type)
+		if None in (sourceNode, targetNode, typeCode):
+			return False
+		return self._hasEdgeCodes(sourceNode, typeCode, targetNode)
+
+	def edges(self, type=None):
+		"""
+		Yield every relationship in the graph, grouped by source
+
+		@param: type, str, only yield relationships of this type
+		@yield: tuples of the form (source ID, relationship type, target ID)
+		"""
+		typeCode = self.typeCodes.get(type) if type is not None else None
+		if type is not None and typeCode is None:
+			return
+		for node in range(len(self.ids)):
+			source = self.ids[node]
+			for i in range(self.outOffsets[node], self.outOffsets[node + 1]):
+				if typeCode is None or self.outTypes[i] == typeCode:
+					yield (source, self.types[self.outTypes[i]],
+						self.ids[self.outTargets[i]])
+
+	def neighbourhood(self, snacID, hops=1, direction="both"):
+		"""
+		Find every constellation within a number of hops of a constellation
+
+		@param: snacID, str, the SNAC ID to start from
+		@param: hops, int, the most relationships to follow
+		@param: direction, str, "out", "in" or "both"
+		@return: a dict of the form {SNAC ID: hops away}, including snacID
+		"""
+		start = self.idCodes.get(str(snacID))
+		if start is None:
+			return {}
+
+		rows = []
+		if direction in ("out", "both"):
+			rows.append((self.outOffsets, self.outTargets))
+		if direction in ("in", "both"):
+			rows.append((self.inOffsets, self.inSources))
+
+		distances = {start: 0}
+		frontier = [start]
+		for hop in range(1, hops + 1):
+			nextFrontier = []
+			for node in frontier:
+				for offsets, others in rows:
+					for i in range(offsets[node], offsets[node + 1]):
+						other = others[i]
+						if other not in distances:
+							distances[other] = hop
+							nextFrontier.append(other)
+			frontier = nextFrontier
+
+		return {self.ids[node]: hop for node, hop in distances.items()}
+
+	def missingReciprocals(self, skipTypes=("associatedWith",)):
+		"""
+		Find the inverses of relationships that aren't in the graph
+
+		@param: skipTypes, relationship types that don't need an inverse
+		@return: a list of Relationship objects, grouped by source
+		"""
+		# Work out each type's inverse once, as a type code
+		inverseCodes = []
+		for type in self.types:
+			inverse = Relationship.inverseList.get(type, type)
+			inverseCodes.append(self.typeCodes.get(inverse))
+		skipCodes = {self.typeCodes.get(type) for type in skipTypes}
+
+		missing = []
+		for source in range(len(self.ids)):
+			for i in range(self.outOffsets[source], self.outOffsets[source+1]):
+				typeCode = self.outTypes[i]
+				if typeCode in skipCodes:
+					continue
+				target = self.outTargets[i]
+				inverse = inverseCodes[typeCode]
+				if inverse is None or \
+					not self._hasEdgeCodes(target, inverse, source):
+					type = self.types[typeCode]
+					inverseType = Relationship.inverseList.get(type, type)
+					missing.append(Relationship(self.ids[target],
+						self.ids[source], inverseType))
+		return missing
+
+	def danglingTargets(self, knownIds):
+		"""
+		Find the relationship targets that aren't among a set of IDs
+
+		Useful for spotting relationships to outdated (e.g. merged) IDs.
+
+		@param: knownIds, a set of the SNAC IDs that are current
+		@return: a dict of the form {target ID: # relationships pointing at it}
+		"""
+		dangling = {}
+		for node, snacID in enumerate(self.ids):
+			count = self.inOffsets[node + 1] - self.inOffsets[node]
+			if count > 0 and snacID not in knownIds:
+				dangling[snacID] = count
+		return dangling
+
+	def _neighbours(self, snacID, type, offsets, others, types):
+		"""Return the distinct IDs in a node's row of one set of arrays"""
+		node = self.idCodes.get(str(snacID))
+		if node is None:
+			return []
+		typeCode = self.typeCodes.get(type) if type is not None else None
+		if type is not None and typeCode is None:
+			return []
+
+		neighbours = []
+		previous = None
+		for i in range(offsets[node], offsets[node + 1]):
+			if typeCode is not None and types[i] != typeCode:
+				continue
+			if others[i] != previous:
+				neighbours.append(self.ids[others[i]])
+				previous = others[i]
+		return neighbours
+
+	def _hasEdgeCodes(self, source, typeCode, target):
+		"""Binary search a node's (sorted) outgoing edges for an edge"""
+		start, end = self.outOffsets[source], self.outOffsets[source + 1]
+		i = bisect_left(self.outTargets, target, start, end)
+		while i < end and self.outTargets[i] == target:
+			if self.outTypes[i] == typeCode:
+				return True
+			i += 1
+		return False
+
+	def _compress(self, rows, types, columns):
+		"""
+		Turn parallel arrays of edges into CSR arrays, sorted within each row
+
+		@return: a tuple of the form (offsets, columns, types)
+		"""
+		numNodes, numTypes = len(self.ids), max(len(self.types), 1)
+
+		# Pack each edge into one int, so sorting them is a plain int sort
+		width = numNodes * numTypes
+		keys = sorted(set(r * width + c * numTypes + t
+			for r, t, c in zip(rows, types, columns)))
+
+		offsets = array("q", bytes(8 * (numNodes + 1)))
+		sortedColumns, sortedTypes = array("i"), array("i")
+		for key in keys:
+			row, rest = divmod(key, width)
+			column, type = divmod(rest, numTypes)
+			offsets[row + 1] += 1
+			sortedColumns.append(column)
+			sortedTypes.append(type)
+
+		for node in range(numNodes):
+			offsets[node + 1] += offsets[node]
+
+		return offsets, sortedColumns, sortedTypes
+
+	@staticmethod
+	def _code(value, values, codes):
+		"""Return a value's integer code, giving it a new one if need be"""
+		value = str(value)
+		code = codes.get(value)
+		if code is None:
+			code = len(values)
+			codes[value] = code
+			values.append(value)
+		return code
@@ -5,10 +5,11 @@ Written by James Truitt of Swarthmore College's Friends Historical Library,
 July 2022.
 """
 
-import json, requests, secret
-from utils import loadSnacData, apiError, postToApi, verifyApiSuccess
-from apiEditUtils import checkOutConstellation, publishConstellation
-from apiEditUtils import getUserInput, pushChangesToSnac
+import argparse
+from functools import partial
+from utils import loadSnacData
+from apiEditUtils import getUserInput, makeEdits, getApiUrl
+from apiEditUtils import getEditJournal
 
 def compileEditList(constellations):
 	"""
@@ -87,7 +88,8 @@ def buildMinimalUpdateConstellation(constellation, subjIds):
 
 	return miniConst
 
-def makeUpdates(updateDict, apiKey, production = False):
+def makeUpdates(updateDict, apiKey, production = False, maxInFlight=4,
+	journal=None):
 	"""
 	Remove duplicate subjects in constellations on SNAC.
 
@@ -100,6 +102,8 @@ def makeUpdates(updateDict, apiKey, production = False):
 	@param: updateDict, dict, keys: strs, values: lists of strs
 	@param: apiKey, str, user API key to authenticate the modifications
 	@param: production, bool, whether to use production or development server
+	@param: maxInFlight, int, the most constellations to edit at once
+	@param: journal, an EditJournal to record (& resume) progress in
 	"""
 	print("Making changes to", len(updateDict), "constellations...")
 	# Validate arguments
@@ -108,107 +112,27 @@ def makeUpdates(updateDict, apiKey, production = False):
 
 		return None
 
-	# Set appropriate URL
-	if production == True:
-		baseUrl = "https://api.snaccooperative.org"
-	else:
-		baseUrl = "http://snac-dev.iath.virginia.edu/api/"
-
-	# Declare variables to track successes & failures of API calls
-	successCount = 0
-	errors = []
-
-	# Loop over constellations to modify, making those API calls
-	counter = 0
+	# Pair each constellation with a function building its minimal update
+	jobs = []
 	for snacID in updateDict:
-		counter += 1
-
-		# For limiting scope of test runs
-		# if counter > 3:
-		# 	break
-
-		try:
-			# Print status message
-			print("Updating constellation", counter, "...", end="\r")
-
-			# Get list of instance ids of dup subject to remove
-			subjIds = updateDict[snacID]
-
-
-			##### CHECK OUT CONSTELLATIONS #####
-
-			# Make API call to check out constellation
-			response = checkOutConstellation(snacID, apiKey, baseUrl)
-
-			# Verify that API call worked; raise an apiError if API call failed
-			try:
-				verifyApiSuccess(response)
-			except apiError as e:
-				msg = "\nCould not check out " + str(snacID)
-				msg += " due to the following error:\n" + e.message
-				raise apiError(msg)
-
-			##### Make needed changes to constellation returned by API #####
-			constellation = response["constellation"]
-			miniConst = buildMinimalUpdateConstellation(constellation, subjIds)
-
-			##### PUSH CHANGES TO API #####
+		build = partial(buildMinimalUpdateConstellation,
+			subjIds=updateDict[snacID])
+		jobs.append((snacID, build, updateDict[snacID]))
 
-			# Make API call to push changes to SNAC using "update_constellation"
-			response = pushChangesToSnac(miniConst, apiKey, baseUrl)
+	# Check out, update & publish the constellations, several at a time
+	makeEdits(jobs, apiKey, getApiUrl(production), maxInFlight, journal)
 
-			# Verify that API call worked; raise and apiError if it failed
-			try:
-				verifyApiSuccess(response)
-			except apiError as e:
-				msg = "\nCould not update " + str(snacID)
-				msg += " due to the following error:\n" + e.message
-				raise apiError(msg)
-
-			##### PUBLISH CHANGED CONSTELLATION ON SNAC #####
-
-			# Get miniConst from the response to the update command
-			miniConst = response["constellation"]
-
-
-			# Make API call to publish, using "publish_constellation"
-			response = publishConstellation(miniConst, apiKey, baseUrl)
-
-			# Verify that API call worked; raise and apiError if it failed
-			try:
-				verifyApiSuccess(response)
-			except apiError as e:
-				msg = "\nCould not update " + str(snacID)
-				msg += " due to the following error:\n" + e.message
-				raise apiError(msg)
-
-			# Note that modifications to this constellation have succeeded.
-			successCount += 1
-
-		# If there's an API error, log it and move on to next constellation
-		except apiError as e:
-			errors.append(e)
-			continue
-		except Exception as e:
-			print("\nFatal error encountered on constellation", snacID)
-			raise e
-
-	# Print message
-	print("Successfully updated", successCount, "constellations.")
-
-	# Print list of API errors encountered
-	numErrors = len(errors)
-	if numErrors > 0:
-		if numErrors == 1:
-			print("Encountered 1 error:")
-		else:
-			print("Encountered", numErrors, "errors:")
-		for error in errors:
-			print(error)
+def main():
+	# API keys are only needed to make edits, not to plan them
+	import secret
 
-	print("")
+	parser = argparse.ArgumentParser()
+	msg = "the most constellations to edit at once"
+	parser.add_argument("--in-flight", type=int, default=4, help=msg)
+	msg = "ignore the journal of earlier runs and edit every constellation"
+	parser.add_argument("--restart", action="store_true", help=msg)
+	args = parser.parse_args()
 
-def main():
 	print()
 
 
@@ -227,8 +151,12 @@ def main():
 	# Get dict of which constellations to edit and how
 	updatesToMake = compileEditList(constellations)
 
-	# Make API calls to update constellations in SNAC
-	makeUpdates(updatesToMake, apiKey, production = useProduction)
+	# Make API calls to update constellations in SNAC, resuming from where any
+	# earlier run got to
+	journal = getEditJournal("removeDupSubjsJournal.tsv", useProduction,
+		args.restart)
+	makeUpdates(updatesToMake, apiKey, production = useProduction,
+		maxInFlight = args.in_flight, journal = journal)
 
 
 if __name__ == "__main__":
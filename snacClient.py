@@ -0,0 +1,153 @@
+"""
+A shared HTTP client for the SNAC REST API.
+
+Every API call goes through a SnacClient, which keeps a pool of keep-alive
+connections per server (so thousands of calls don't each pay for a new TCP &
+TLS handshake), puts a timeout on every request, paces requests with the
+shared rate limits in rateLimiter, and retries throttled or failed requests
+with exponential backoff & jitter.
+
+Scripts normally don't create clients themselves: `getClient(baseUrl)` returns
+the one shared client for a server, and `utils.postToApi` uses it.
+"""
+
+import json, random, threading, time, requests
+from rateLimiter import getLimiter
+
+# Responses worth trying again after a pause
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Commands that don't change anything on SNAC, so are always safe to resend
+READ_COMMANDS = {"read", "read_resource", "constellation_history",
+	"download_constellation", "recently_published", "browse", "search"}
+
+class SnacClient:
+	"""
+	A pooled, retrying connection to one SNAC server
+
+	A client can be shared between threads; at most poolSize requests are
+	sent to the server at once, & any more wait for a free connection.
+
+	Attributes:
+		baseUrl: str, the URL of the SNAC REST API to call
+		session: the requests.Session holding the connection pool
+		timeout: tuple of the form (connect seconds, read seconds)
+		maxRetries: int, how many times to retry a request before giving up
+		backoff: float, seconds to wait (on average) before the first retry,
+			doubling with each retry after that
+		maxBackoff: float, the longest to wait between retries
+	"""
+
+	def __init__(self, baseUrl, poolSize=8, timeout=(10, 120), maxRetries=5,
+		backoff=1.0, maxBackoff=60.0):
+		self.baseUrl = baseUrl
+		self.timeout = timeout
+		self.maxRetries = maxRetries
+		self.backoff = backoff
+		self.maxBackoff = maxBackoff
+
+		# pool_block caps the number of connections open to each host
+		self.session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=4,
+			pool_maxsize=poolSize, pool_block=True)
+		self.session.mount("http://", adapter)
+		self.session.mount("https://", adapter)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *excInfo):
+		self.close()
+
+	def close(self):
+		"""Close all of the client's connections"""
+		self.session.close()
+
+	def call(self, request, method="PUT"):
+		"""
+		Send a command to the SNAC API & return its response
+
+		Read-only commands are retried on throttling, server errors & dropped
+		connections. Commands that change data are only retried when SNAC
+		can't have acted on them (throttling, or failing to connect at all).
+
+		@param: request, dict, the JSON body of the API call
+		@param: method, str, the HTTP verb to use ("PUT" or "POST")
+		@return: the API response in dict form
+		"""
+		idempotent = request.get("command") in READ_COMMANDS
+		limiter = getLimiter(self.baseUrl, "read" if idempotent else "edit")
+		data = json.dumps(request)
+		response = self._send(method, self.baseUrl, idempotent, limiter,
+			data=data)
+		return response.json()
+
+	def get(self, url=None):
+		"""
+		Make a GET request (e.g. for a raw file) & return the response
+
+		@param: url, str, the URL to get (by default, self.baseUrl)
+		@return: a requests.Response
+		"""
+		return self._send("GET", url or self.baseUrl, True)
+
+	def _send(self, method, url, idempotent, limiter=None, **kwargs):
+		"""Make a request, retrying with backoff where it's safe to"""
+		attempt = 0
+		while True:
+			if limiter is not None:
+				limiter.acquire()
+			try:
+				response = self.session.request(method, url,
+					timeout=self.timeout, **kwargs)
+			except requests.exceptions.ConnectTimeout:
+				# The request never reached the server, so resending is safe
+				if attempt >= self.maxRetries:
+					raise
+			except (requests.exceptions.ConnectionError,
+				requests.exceptions.Timeout):
+				if not idempotent or attempt >= self.maxRetries:
+					raise
+			else:
+				retryable = response.status_code == 429 or \
+					(idempotent and response.status_code in RETRY_STATUSES)
+				if not retryable:
+					return response
+				if attempt >= self.maxRetries:
+					response.raise_for_status()
+				if self._waitForRetryAfter(response):
+					attempt += 1
+					continue
+
+			self._sleepBeforeRetry(attempt)
+			attempt += 1
+
+	def _sleepBeforeRetry(self, attempt):
+		"""Wait a random time of up to backoff * 2^attempt ("full jitter")"""
+		limit = min(self.maxBackoff, self.backoff * 2 ** attempt)
+		time.sleep(random.uniform(0, limit))
+
+	def _waitForRetryAfter(self, response):
+		"""Honour a Retry-After header, if the server sent one in seconds"""
+		try:
+			seconds = float(response.headers["Retry-After"])
+		except (KeyError, ValueError):
+			return False
+		time.sleep(min(seconds, self.maxBackoff))
+		return True
+
+_clients = {}
+_clientsLock = threading.Lock()
+
+def getClient(baseUrl, poolSize=8):
+	"""
+	Return the shared client for a SNAC server, creating it the first time
+
+	@param: baseUrl, str, the URL of the SNAC REST API to call
+	@param: poolSize, int, connections to keep open if the client is new
+	@return: a SnacClient
+	"""
+	with _clientsLock:
+		if baseUrl not in _clients:
+			_clients[baseUrl] = SnacClient(baseUrl, poolSize)
+		return _clients[baseUrl]
@@ -0,0 +1,464 @@
+"""
+A persistent, indexed copy of the constellations downloaded to `snac_jsons`.
+
+The store is an SQLite database (`snac_jsons/snacStore.sqlite`) holding every
+constellation, keyed by the file it came from, along with indexes on SNAC ID,
+ark, entity type, relation target and subject term ID. Each top-level key of a
+constellation is kept as its own compact JSON value, so scripts that only need
+a few keys never decode the rest (e.g. long biogHists or maintenanceEvents).
+
+The store also keeps flat facet tables (subjects, occupations, genders,
+relations, places and dates), with vocabulary terms coded as integers in a
+shared terms table, so reports like subject counts are a single GROUP BY
+rather than a pass over every constellation.
+Syncing only re-parses JSON files that are new or have changed since the last
+sync, so scripts no longer have to read every file on every run. Deleting the
+database simply causes it to be rebuilt from the JSON files.
+"""
+
+import json, os, sqlite3
+from glob import glob
+from itertools import islice, groupby
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+# The tables holding one row per entry in a constellation's lists
+FACETS = ["relations", "subjects", "occupations", "genders", "places", "dates"]
+
+# Bump this whenever SCHEMA changes, so old stores get rebuilt
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS constellations (
+	filename TEXT PRIMARY KEY,
+	id TEXT,
+	ark TEXT,
+	entityType TEXT,
+	version TEXT,
+	mtime INTEGER,
+	size INTEGER
+);
+CREATE INDEX IF NOT EXISTS constellationId ON constellations (id);
+CREATE INDEX IF NOT EXISTS constellationArk ON constellations (ark);
+CREATE INDEX IF NOT EXISTS constellationType ON constellations (entityType);
+
+CREATE TABLE IF NOT EXISTS fields (
+	filename TEXT,
+	position INTEGER,
+	field TEXT,
+	json TEXT,
+	PRIMARY KEY (filename, position)
+);
+CREATE INDEX IF NOT EXISTS fieldName ON fields (field, filename);
+
+CREATE TABLE IF NOT EXISTS relations (
+	filename TEXT,
+	source TEXT,
+	type TEXT,
+	target TEXT
+);
+CREATE INDEX IF NOT EXISTS relationFile ON relations (filename);
+CREATE INDEX IF NOT EXISTS relationTarget ON relations (target);
+
+CREATE TABLE IF NOT EXISTS terms (
+	code INTEGER PRIMARY KEY,
+	termId TEXT,
+	term TEXT,
+	UNIQUE (termId, term)
+);
+CREATE INDEX IF NOT EXISTS termId ON terms (termId);
+
+CREATE TABLE IF NOT EXISTS subjects (filename TEXT, id TEXT, code INTEGER);
+CREATE INDEX IF NOT EXISTS subjectFile ON subjects (filename);
+CREATE INDEX IF NOT EXISTS subjectCode ON subjects (code);
+
+CREATE TABLE IF NOT EXISTS occupations (filename TEXT, id TEXT, code INTEGER);
+CREATE INDEX IF NOT EXISTS occupationFile ON occupations (filename);
+CREATE INDEX IF NOT EXISTS occupationCode ON occupations (code);
+
+CREATE TABLE IF NOT EXISTS genders (filename TEXT, id TEXT, code INTEGER);
+CREATE INDEX IF NOT EXISTS genderFile ON genders (filename);
+
+CREATE TABLE IF NOT EXISTS places (
+	filename TEXT,
+	id TEXT,
+	role INTEGER,
+	place TEXT
+);
+CREATE INDEX IF NOT EXISTS placeFile ON places (filename);
+
+CREATE TABLE IF NOT EXISTS dates (
+	filename TEXT,
+	id TEXT,
+	fromDate TEXT,
+	toDate TEXT
+);
+CREATE INDEX IF NOT EXISTS dateFile ON dates (filename);
+"""
+
+class SnacStore:
+	"""
+	An indexed local store of SNAC constellations
+
+	Iterating over the store yields every constellation in dict form, ordered
+	by filename so that runs are repeatable.
+
+	Attributes:
+		filename: str, the SQLite database the store is kept in
+		directory: str, the folder of constellation JSON files it mirrors
+		connection: the sqlite3.Connection to the database
+		termCodes: dict of the form {(term ID, term): code in the terms table}
+	"""
+
+	def __init__(self, filename="snac_jsons/snacStore.sqlite",
+		directory="snac_jsons"):
+		self.filename = filename
+		self.directory = directory
+		self.connection = sqlite3.connect(filename)
+
+		# Throw away a store built by an older version of this module
+		query = "PRAGMA user_version"
+		if self.connection.execute(query).fetchone()[0] != SCHEMA_VERSION:
+			for table in ["constellations", "fields", "terms"] + FACETS:
+				self.connection.execute("DROP TABLE IF EXISTS " + table)
+			query = "PRAGMA user_version = {}".format(SCHEMA_VERSION)
+			self.connection.execute(query)
+		self.connection.executescript(SCHEMA)
+
+		query = "SELECT termId, term, code FROM terms"
+		rows = self.connection.execute(query)
+		self.termCodes = {(termId, term): code for termId, term, code in rows}
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *excInfo):
+		self.close()
+
+	def __len__(self):
+		query = "SELECT COUNT(*) FROM constellations"
+		return self.connection.execute(query).fetchone()[0]
+
+	def __iter__(self):
+		return self.iterConstellations()
+
+	def iterConstellations(self, entityType=None, hasField=None, processes=1,
+		fields=None):
+		"""
+		Yield constellations one at a time, ordered by filename
+
+		@param: entityType, str, only yield constellations of this entity type
+				(e.g. "person"), looked up through the entity type index
+		@param: hasField, str, only yield constellations where this key is
+				present & non-empty (e.g. "subjects")
+		@param: processes, int, how many processes to parse the JSON with
+		@param: fields, list of str, only include these top-level keys in each
+				constellation (hasField is always included); None for all keys
+		@yield: SNAC constellations in dict form
+		"""
+		where, params = self._projection(fields, hasField)
+		query = "SELECT c.filename, f.field, f.json FROM constellations AS c "
+		query += "LEFT JOIN fields AS f ON f.filename = c.filename" + where
+		if entityType is not None:
+			query += " WHERE c.entityType = ?"
+			params.append(entityType)
+		query += " ORDER BY c.filename, f.position"
+
+		rows = self.connection.execute(query, params)
+		groups = (_pairs(group) for filename, group in groupby(rows, _first))
+		decode = partial(_decode, hasField=hasField)
+		for constellation in parseInOrder(decode, groups, processes):
+			if constellation is not None:
+				yield constellation
+
+	def close(self):
+		"""Commit any outstanding changes & close the database"""
+		self.connection.commit()
+		self.connection.close()
+
+	def sync(self, processes=1):
+		"""
+		Bring the store up to date with the JSON files in self.directory
+
+		Files are only parsed if they're new or their size or modification
+		time has changed; rows for files that no longer exist are dropped.
+
+		@param: processes, int, how many processes to parse the files with
+		@return: a dict counting the "added", "updated" & "removed" files
+		"""
+		counts = {"added": 0, "updated": 0, "removed": 0}
+
+		query = "SELECT filename, mtime, size FROM constellations"
+		known = {row[0]: row[1:] for row in self.connection.execute(query)}
+
+		# Work out which files need (re-)reading before reading any of them
+		toRead = []
+		for filename in sorted(glob(os.path.join(self.directory, "*.json"))):
+			stat = os.stat(filename)
+			signature = (stat.st_mtime_ns, stat.st_size)
+			if known.pop(filename, None) != signature:
+				toRead.append((filename, signature))
+
+		filenames = (filename for filename, signature in toRead)
+		parsed = parseInOrder(_readJsonFile, filenames, processes)
+		for (filename, signature), constellation in zip(toRead, parsed):
+			if self.remove(filename):
+				counts["updated"] += 1
+			else:
+				counts["added"] += 1
+			self.add(constellation, filename, *signature)
+
+		# Anything left over has been deleted from the folder
+		for filename in known:
+			self.remove(filename)
+			counts["removed"] += 1
+
+		self.connection.commit()
+		return counts
+
+	def add(self, constellation, filename, mtime=0, size=0):
+		"""
+		Add a constellation & its index entries to the store
+
+		@param: constellation, dict, a SNAC constellation
+		@param: filename, str, the JSON file the constellation is kept in
+		@param: mtime, int, the file's modification time in nanoseconds
+		@param: size, int, the file's size in bytes
+		"""
+		entityType = constellation.get("entityType", {}).get("term")
+		self.connection.execute(
+			"INSERT INTO constellations VALUES (?, ?, ?, ?, ?, ?, ?)",
+			(filename, constellation["id"], constellation["ark"], entityType,
+			constellation.get("version"), mtime, size))
+
+		values = []
+		for position, (field, value) in enumerate(constellation.items()):
+			text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+			values.append((filename, position, field, text))
+		self.connection.executemany(
+			"INSERT INTO fields VALUES (?, ?, ?, ?)", values)
+
+		relations = []
+		for relation in constellation.get("relations", []):
+			relations.append((filename, relation["sourceConstellation"],
+				relation["type"]["term"], relation["targetConstellation"]))
+		self.connection.executemany(
+			"INSERT INTO relations VALUES (?, ?, ?, ?)", relations)
+
+		snacID = constellation["id"]
+		for facet in ["subjects", "occupations", "genders"]:
+			rows = []
+			for entry in constellation.get(facet, []):
+				rows.append((filename, snacID, self.termCode(entry["term"])))
+			query = "INSERT INTO {} VALUES (?, ?, ?)".format(facet)
+			self.connection.executemany(query, rows)
+
+		places = []
+		for place in constellation.get("places", []):
+			role = self.termCode(place["role"]) if "role" in place else None
+			if "geoplace" in place:
+				name = place["geoplace"].get("name")
+			else:
+				name = place.get("original")
+			places.append((filename, snacID, role, name))
+		self.connection.executemany(
+			"INSERT INTO places VALUES (?, ?, ?, ?)", places)
+
+		dates = []
+		for date in constellation.get("dates", []):
+			dates.append((filename, snacID, date.get("fromDate"),
+				date.get("toDate")))
+		self.connection.executemany(
+			"INSERT INTO dates VALUES (?, ?, ?, ?)", dates)
+
+	def termCode(self, term):
+		"""
+		Return the integer code for a vocabulary term, adding it if it's new
+
+		@param: term, dict, a SNAC term (e.g. a subject's "term" entry)
+		@return: int, the term's code in the terms table
+		"""
+		key = (term.get("id"), term.get("term"))
+		if key not in self.termCodes:
+			cursor = self.connection.execute(
+				"INSERT INTO terms (termId, term) VALUES (?, ?)", key)
+			self.termCodes[key] = cursor.lastrowid
+		return self.termCodes[key]
+
+	def remove(self, filename):
+		"""
+		Drop a file's constellation & index entries from the store
+
+		@param: filename, str, the JSON file whose entries should be dropped
+		@return: bool, whether there was anything to drop
+		"""
+		cursor = self.connection.execute(
+			"DELETE FROM constellations WHERE filename = ?", (filename,))
+		self.connection.execute(
+			"DELETE FROM fields WHERE filename = ?", (filename,))
+		for facet in FACETS:
+			query = "DELETE FROM {} WHERE filename = ?".format(facet)
+			self.connection.execute(query, (filename,))
+		return cursor.rowcount > 0
+
+	def get(self, snacID, fields=None):
+		"""Return the constellation with a given SNAC ID, or None"""
+		return self._fetchOne("id", str(snacID), fields)
+
+	def getByArk(self, ark, fields=None):
+		"""Return the constellation with a given ark, or None"""
+		return self._fetchOne("ark", ark, fields)
+
+	def ids(self):
+		"""Return a set of every SNAC ID in the store"""
+		query = "SELECT id FROM constellations"
+		return {row[0] for row in self.connection.execute(query)}
+
+	def versions(self):
+		"""Return a dict of the form {SNAC ID: (version, filename)}"""
+		query = "SELECT id, version, filename FROM constellations"
+		return {row[0]: (row[1], row[2]) for row in
+			self.connection.execute(query)}
+
+	def idsOfType(self, entityType):
+		"""Return the SNAC IDs of every constellation of a given entity type"""
+		query = "SELECT id FROM constellations WHERE entityType = ?"
+		return self._fetchIds(query, entityType)
+
+	def idsRelatedTo(self, snacID):
+		"""Return the SNAC IDs of every constellation with a relation to an ID"""
+		query = "SELECT DISTINCT source FROM relations WHERE target = ?"
+		return self._fetchIds(query, str(snacID))
+
+	def idsWithSubject(self, termID):
+		"""Return the SNAC IDs of every constellation with a given subject"""
+		query = "SELECT DISTINCT s.id FROM subjects AS s "
+		query += "JOIN terms AS t ON t.code = s.code WHERE t.termId = ?"
+		return self._fetchIds(query, str(termID))
+
+	def iterRelations(self):
+		"""Yield every relation in the store as a (source, type, target) tuple"""
+		query = "SELECT source, type, target FROM relations ORDER BY rowid"
+		return iter(self.connection.execute(query))
+
+	def countTerms(self, facet):
+		"""
+		Count how many times each term appears in a facet across the store
+
+		@param: facet, str, one of "subjects", "occupations" or "genders"
+		@return: a dict of the form {(term ID, term): # occurrences}
+		"""
+		if facet not in ["subjects", "occupations", "genders"]:
+			raise ValueError("Not a term facet: " + facet)
+		query = "SELECT t.termId, t.term, COUNT(*) FROM {} AS f "
+		query += "JOIN terms AS t ON t.code = f.code "
+		query += "GROUP BY f.code ORDER BY MIN(f.rowid)"
+		rows = self.connection.execute(query.format(facet))
+		return {(termId, term): count for termId, term, count in rows}
+
+	def countEntries(self, facet, role=None):
+		"""
+		Count how many entries each constellation has in a facet
+
+		Constellations with no entries at all are included, with a count of 0.
+
+		@param: facet, str, the name of one of the FACETS tables
+		@param: role, str, only count places with this role (e.g. "Birth")
+		@return: a dict of the form {ark: # entries}
+		"""
+		if facet not in FACETS:
+			raise ValueError("Not a facet: " + facet)
+		query = "SELECT c.ark, COUNT(f.filename) FROM constellations AS c "
+		query += "LEFT JOIN {} AS f ON f.filename = c.filename".format(facet)
+		params = []
+		if role is not None:
+			query += " AND f.role IN "
+			query += "(SELECT code FROM terms WHERE term = ?)"
+			params.append(role)
+		query += " GROUP BY c.filename ORDER BY c.filename"
+		return dict(self.connection.execute(query, params).fetchall())
+
+	def _fetchOne(self, column, value, fields=None):
+		"""Look up one constellation by an indexed column, or return None"""
+		query = "SELECT filename FROM constellations WHERE {} = ?"
+		row = self.connection.execute(query.format(column), (value,)).fetchone()
+		if row is None:
+			return None
+
+		where, params = self._projection(fields)
+		query = "SELECT field, json FROM fields AS f WHERE f.filename = ?"
+		query += where + " ORDER BY position"
+		return _decode(list(self.connection.execute(query, [row[0]] + params)))
+
+	def _projection(self, fields, hasField=None):
+		"""
+		Build the SQL condition limiting a query to certain fields
+
+		@return: a tuple of the form (condition, list of parameters)
+		"""
+		if fields is None:
+			return "", []
+		fields = set(fields)
+		if hasField is not None:
+			fields.add(hasField)
+		marks = ", ".join("?" * len(fields))
+		return " AND f.field IN ({})".format(marks), sorted(fields)
+
+	def _fetchIds(self, query, value):
+		"""Run a query for one ID column & return the results as a list"""
+		return [row[0] for row in self.connection.execute(query, (value,))]
+
+def parseInOrder(parse, items, processes=1, batchSize=32):
+	"""
+	Apply a parsing function to each item, across several processes if asked
+
+	Results come back in the same order as items, whatever the number of
+	processes. Items are handed out a few batches at a time, so a long
+	iterable is never read into memory all at once.
+
+	@param: parse, a module-level function taking one item
+	@param: items, an iterable of picklable items (e.g. filenames)
+	@param: processes, int, how many processes to use (1 parses in this one)
+	@param: batchSize, int, how many items to send to a process at once
+	@yield: the result of parse(item) for each item
+	"""
+	if processes <= 1:
+		for item in items:
+			yield parse(item)
+		return
+
+	items = iter(items)
+	with ProcessPoolExecutor(max_workers=processes) as executor:
+		while True:
+			batch = list(islice(items, batchSize * processes))
+			if len(batch) == 0:
+				return
+			yield from executor.map(parse, batch, chunksize=batchSize)
+
+def _readJsonFile(filename):
+	"""Read one constellation file into a dict"""
+	with open(filename, encoding="utf-8") as f:
+		return json.load(f)
+
+def _decode(pairs, hasField=None):
+	"""
+	Rebuild a constellation from its stored fields
+
+	@param: pairs, a list of (field, JSON text) tuples
+	@param: hasField, str, return None unless this field is present & non-empty
+	@return: a SNAC constellation in dict form, or None
+	"""
+	constellation = {}
+	for field, text in pairs:
+		constellation[field] = json.loads(text)
+	if hasField is not None and not constellation.get(hasField):
+		return None
+	return constellation
+
+def _first(row):
+	"""Return a row's first column"""
+	return row[0]
+
+def _pairs(rows):
+	"""Turn a filename's (filename, field, json) rows into (field, json) pairs"""
+	return [(field, text) for filename, field, text in rows if field is not None]
@@ -6,11 +6,12 @@ Written by James Truitt of Swarthmore College's Friends Historical Library,
 November 2021.
 """
 
-import json, requests, secret
+import argparse, json
+from functools import partial
 from glob import glob
-from utils import loadIdsToUpdate, apiError, postToApi, verifyApiSuccess
-from apiEditUtils import checkOutConstellation, publishConstellation
-from apiEditUtils import getUserInput, pushChangesToSnac
+from utils import loadIdsToUpdate, JSON_STRING
+from apiEditUtils import getUserInput, makeEdits, getApiUrl
+from apiEditUtils import getEditJournal
 
 def makeDict(listOfLists):
 	"""
@@ -35,7 +36,8 @@ def compileEditList(idsToUpdate):
 	Find out what SNAC constellations need to be updated & what edits they need.
 
 	Check JSON files containing constellation data against a dict whose keys
-	are outdated identifiers.
+	are outdated identifiers. Each file is scanned once, however many outdated
+	identifiers there are: every JSON string in it is looked up in the dict.
 
 	@param: idsToUpdate, a dict w/ entries of the form
 		outdatedId: {"newId":newId, "newArk":newArk}
@@ -53,6 +55,9 @@ def compileEditList(idsToUpdate):
 	# Initialize the dict we'll return
 	recordsToUpdate = {}
 
+	# Remember the order of the outdated IDs, to list them in that order
+	order = {outdatedId: i for i, outdatedId in enumerate(idsToUpdate)}
+
 	# Print status message
 	print("Checking", len(filenames), "constellations for outdated IDs...")
 
@@ -73,25 +78,26 @@ def compileEditList(idsToUpdate):
 		# Extract the record's SNAC ID, for the API call later
 		snacID = json.loads(filedata)["id"]
 
-		# Loop over the outdated IDs, seeing if any are in this record
-		for outdatedId in idsToUpdate:
+		# Find any outdated IDs among the strings in this record
+		found = set()
+		for match in JSON_STRING.finditer(filedata):
+			if match.group(1) in idsToUpdate:
+				found.add(match.group(1))
 
-			# If one of the outdated IDs is in this record,
-			if "\"" + outdatedId + "\"" in filedata:
+		# If any of the outdated IDs are in this record,
+		for outdatedId in sorted(found, key=order.get):
 
-				# Add record's ID (if needed) to the dict we're compiling
-				if snacID not in recordsToUpdate:
-					recordsToUpdate[snacID] = {}
+			# Add record's ID (if needed) to the dict we're compiling
+			if snacID not in recordsToUpdate:
+				recordsToUpdate[snacID] = {}
 
-				# Add outdated ID (& current IDs) to record's dict entry
-				# {snacID: {outdatedId: idsToUpdate[outdatedId]}}
-				recordsToUpdate[snacID][outdatedId] = idsToUpdate[outdatedId]
+			# Add outdated ID (& current IDs) to record's dict entry
+			# {snacID: {outdatedId: idsToUpdate[outdatedId]}}
+			recordsToUpdate[snacID][outdatedId] = idsToUpdate[outdatedId]
 
 	print("Successfully compiled list of constellations to update.\n")
 	return recordsToUpdate
 
-	print("\nSuccessfully updated files.\n")
-
 def validateIdentifiers(updateDict):
 	"""Ensures all SNAC IDs and Arks in the dictionary are well-formed"""
 	# Check snac IDs
@@ -177,7 +183,8 @@ def buildMinimalUpdateConstellation(constellation, updateDict):
 
 	return miniConst
 
-def makeUpdates(updateDict, apiKey, production = False):
+def makeUpdates(updateDict, apiKey, production = False, maxInFlight=4,
+	journal=None):
 	"""
 	Update outdated target IDs in constellation relationships on SNAC.
 
@@ -192,6 +199,8 @@ def makeUpdates(updateDict, apiKey, production = False):
 	@param: updateDict, dict, data to update (see compileEditList for format)
 	@param: apiKey, str, user API key to authenticate the modifications
 	@param: production, bool, whether to use production or development server
+	@param: maxInFlight, int, the most constellations to edit at once
+	@param: journal, an EditJournal to record (& resume) progress in
 	"""
 	print("Making changes to", len(updateDict), "constellations...")
 	# Validate arguments
@@ -201,106 +210,27 @@ def makeUpdates(updateDict, apiKey, production = False):
 
 		return None
 
-	# Set appropriate URL
-	if production == True:
-		baseUrl = "https://api.snaccooperative.org"
-	else:
-		baseUrl = "http://snac-dev.iath.virginia.edu/api/"
-
-	# Declare variables to track successes & failures of API calls
-	successCount = 0
-	errors = []
-
-	# Loop over constellations to modify, making those API calls
-	counter = 0
+	# Pair each constellation with a function building its minimal update
+	jobs = []
 	for snacID in updateDict:
-		counter += 1
-
-		# For limiting scope of test runs
-		# if counter > 3:
-		# 	break
-
-		try:
-			# Print status message
-			print("Updating constellation", counter, "...", end="\r")
-
-			# Get list of updates to be made
-			updates = updateDict[snacID]
-
-			##### CHECK OUT CONSTELLATIONS #####
-
-			# Make API call to check out constellation
-			response = checkOutConstellation(snacID, apiKey, baseUrl)
-
-			# Verify that API call worked; raise an apiError if API call failed
-			try:
-				verifyApiSuccess(response)
-			except apiError as e:
-				msg = "\nCould not check out " + str(snacID)
-				msg += " due to the following error:\n" + e.message
-				raise apiError(msg)
-
-			##### Make needed changes to constellation returned by API #####
-			constellation = response["constellation"]
-			miniConst = buildMinimalUpdateConstellation(constellation, updates)
+		build = partial(buildMinimalUpdateConstellation,
+			updateDict=updateDict[snacID])
+		jobs.append((snacID, build, updateDict[snacID]))
 
-			##### PUSH CHANGES TO API #####
+	# Check out, update & publish the constellations, several at a time
+	makeEdits(jobs, apiKey, getApiUrl(production), maxInFlight, journal)
 
-			# Make API call to push changes to SNAC using "update_constellation"
-			response = pushChangesToSnac(miniConst, apiKey, baseUrl)
-
-			# Verify that API call worked; raise and apiError if it failed
-			try:
-				verifyApiSuccess(response)
-			except apiError as e:
-				msg = "\nCould not update " + str(snacID)
-				msg += " due to the following error:\n" + e.message
-				raise apiError(msg)
-
-			##### PUBLISH CHANGED CONSTELLATION ON SNAC #####
-
-			# Get miniConst from the response to the update command
-			miniConst = response["constellation"]
-
-
-			# Make API call to publish, using "publish_constellation"
-			response = publishConstellation(miniConst, apiKey, baseUrl)
-
-			# Verify that API call worked; raise and apiError if it failed
-			try:
-				verifyApiSuccess(response)
-			except apiError as e:
-				msg = "\nCould not update " + str(snacID)
-				msg += " due to the following error:\n" + e.message
-				raise apiError(msg)
-
-			# Note that modifications to this constellation have succeeded.
-			successCount += 1
-
-		# If there's an API error, log it and move on to next constellation
-		except apiError as e:
-			errors.append(e)
-			continue
-		except Exception as e:
-			print("\nFatal error encountered on constellation", snacID)
-			raise e
-
-	# Print message
-	print("Successfully updated", successCount, "constellations.")
-
-	# Print list of API errors encountered
-	numErrors = len(errors)
-	if numErrors > 0:
-		if numErrors == 1:
-			print("Encountered 1 error:")
-		else:
-			print("Encountered", numErrors, "errors:")
-		for error in errors:
-			print(error)
+def main():
+	# API keys are only needed to make edits, not to plan them
+	import secret
 
-	print("")
+	parser = argparse.ArgumentParser()
+	msg = "the most constellations to edit at once"
+	parser.add_argument("--in-flight", type=int, default=4, help=msg)
+	msg = "ignore the journal of earlier runs and edit every constellation"
+	parser.add_argument("--restart", action="store_true", help=msg)
+	args = parser.parse_args()
 
-def main():
 	print()
 
 
@@ -322,8 +252,11 @@ def main():
 	# Get list of which constellations to edit & which changes to make
 	updatesToMake = compileEditList(idsToUpdate)
 
-	# Make API calls to update constellations in SNAC
-	makeUpdates(updatesToMake, apiKey, production = production)
+	# Make API calls to update constellations in SNAC, resuming from where any
+	# earlier run got to
+	journal = getEditJournal("updateLinkIdsJournal.tsv", production, args.restart)
+	makeUpdates(updatesToMake, apiKey, production = production,
+		maxInFlight = args.in_flight, journal = journal)
 
 
 if __name__ == "__main__":
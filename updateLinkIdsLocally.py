@@ -1,8 +1,101 @@
+import argparse, re
 from glob import glob
-from utils import loadIdsToUpdate
+from functools import partial
+from utils import loadIdsToUpdate, writeAtomically, JSON_STRING
+from snacStore import parseInOrder
 
-def updateDataInFiles(idsToUpdate, arksToUpdate):
-	"""Find and replace old identifiers across the files in snac_jsons folder"""
+# An ark, as found inside a JSON string, with or without a resolver in front
+ARK = re.compile(r"(?:https?://[\w.-]+/)?ark:/\d+/\w+")
+
+def bareArk(ark):
+	"""Strip the resolver (e.g. "http://n2t.net/") from the front of an ark"""
+	return ark[ark.find("ark:"):] if "ark:" in ark else ark
+
+def addBareArks(arksToUpdate):
+	"""
+	Add the bare form of each ark to a dict of old arks & their replacements
+
+	@param: arksToUpdate, dict of the form {old ark: new ark}
+	@return: a copy with entries of the form {old bare ark: new bare ark}
+		added, so arks given without (or with another) resolver are found too
+	"""
+	arks = {bareArk(old): bareArk(new) for old, new in arksToUpdate.items()}
+	arks.update(arksToUpdate)
+	return arks
+
+def rewriteIdentifiers(filedata, idsToUpdate, arksToUpdate):
+	"""
+	Replace old identifiers in a string of JSON in a single scan
+
+	SNAC IDs are only replaced when they make up a whole JSON string (to avoid
+	replacing portions of longer IDs, because SNAC IDs vary in length); arks
+	are replaced wherever they appear inside a string, whether as full URLs or
+	bare ("ark:/99166/..."). A full ark is replaced as a whole if it's in
+	arksToUpdate; otherwise just its bare part is, keeping its resolver. (Only
+	whole arks are matched, so an old ark that's the start of a longer one is
+	left alone.)
+
+	@param: filedata, str, JSON text
+	@param: idsToUpdate, dict of the form {old SNAC ID: new SNAC ID}
+	@param: arksToUpdate, dict of the form {old ark: new ark} (see
+		addBareArks)
+	@return: a tuple of the form (new JSON text, # of replacements made)
+	"""
+	count = 0
+
+	def replaceArk(match):
+		nonlocal count
+		ark = match.group(0)
+		if ark in arksToUpdate:
+			count += 1
+			return arksToUpdate[ark]
+
+		# Keep whatever resolver the ark was given with
+		start = ark.find("ark:")
+		if ark[start:] in arksToUpdate:
+			count += 1
+			return ark[:start] + arksToUpdate[ark[start:]]
+		return ark
+
+	def replaceString(match):
+		nonlocal count
+		contents = match.group(1)
+		if contents in idsToUpdate:
+			count += 1
+			return "\"" + idsToUpdate[contents] + "\""
+		if "ark:" in contents:
+			return "\"" + ARK.sub(replaceArk, contents) + "\""
+		return match.group(0)
+
+	filedata = JSON_STRING.sub(replaceString, filedata)
+	return filedata, count
+
+def rewriteFile(filename, idsToUpdate, arksToUpdate):
+	"""
+	Replace old identifiers in a file, rewriting it only if anything changed
+
+	@return: the number of replacements made
+	"""
+	with open(filename, "r", encoding="utf-8") as f:
+		filedata = f.read()
+
+	filedata, count = rewriteIdentifiers(filedata, idsToUpdate, arksToUpdate)
+
+	# Write data back to file, atomically, but only if it's changed
+	if count > 0:
+		writeAtomically(filename, filedata)
+	return count
+
+def updateDataInFiles(idsToUpdate, arksToUpdate, processes=1):
+	"""
+	Find and replace old identifiers across the files in snac_jsons folder
+
+	Each file is read & scanned once, and only written if it needed changes.
+
+	@param: idsToUpdate, dict of the form {old SNAC ID: new SNAC ID}
+	@param: arksToUpdate, dict of the form {old ark: new ark}
+	@param: processes, int, how many files to work on at once
+	"""
 	# Do nothing if there are no identifiers to update
 	if len(idsToUpdate) == 0:
 		return None
@@ -15,36 +108,25 @@ def updateDataInFiles(idsToUpdate, arksToUpdate):
 
 	# Loop over the files, reading data from them, making changes, then writing
 	# (Leave the JSON as strings, don't unpack it into dicts)
+	rewrite = partial(rewriteFile, idsToUpdate=idsToUpdate,
+		arksToUpdate=addBareArks(arksToUpdate))
 	counter = 0 # Keep track of how many files we've worked with
-	for filename in filenames:
+	changed = 0 # & how many of them needed changes
+	for count in parseInOrder(rewrite, filenames, processes):
 		# Print helpful message
 		counter += 1
-		print("Updating", filename, "(file", str(counter) + ")...\t", end="\r")
-
-		# Read data from file
-		with open(filename, "r") as f:
-			filedata = f.read()
-
-		# Loop over identifiers to update
-		# Replacing each one in the JSON with the newer version
-		for id in idsToUpdate:
-			# Find SNAC ID in quotes to avoid replacing portions of longer IDs
-			# (because SNAC IDs vary in length)
-			quotedId = "\"" + id + "\""
-			if quotedId in filedata:
-				newQuotedId = "\"" + idsToUpdate[id] + "\""
-				filedata = filedata.replace(quotedId, newQuotedId) #Replacement
-		for ark in arksToUpdate:
-			if ark in filedata:
-				filedata = filedata.replace(ark, arksToUpdate[ark]) #Replacement
-
-		# Write data back to file
-		with open(filename, "w") as f:
-			f.write(filedata)
-
-	print("\nSuccessfully updated files.\n")
+		if count > 0:
+			changed += 1
+		print("Updated file", counter, "...\t", end="\r")
+
+	print("\nSuccessfully updated {} of {} files.\n".format(changed, counter))
 
 def main():
+	parser = argparse.ArgumentParser()
+	msg = "number of processes to rewrite files with"
+	parser.add_argument("--processes", type=int, default=1, help=msg)
+	args = parser.parse_args()
+
 	print()
 
 	# Load data from file
@@ -55,7 +137,7 @@ def main():
 	arksToUpdate = {item[2]: item[3] for item in newIdsAndArks}
 
 	# Find-and-replace the IDs and Arks across the JSON files
-	updateDataInFiles(idsToUpdate, arksToUpdate)
+	updateDataInFiles(idsToUpdate, arksToUpdate, args.processes)
 
 
 if __name__ == "__main__":
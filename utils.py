@@ -1,5 +1,11 @@
-from glob import glob
-import json, requests
+import os, re, tempfile
+from sys import intern
+from snacStore import SnacStore
+from snacClient import getClient
+
+# A string in JSON text, quotes & all; group 1 is its (still escaped) contents.
+#	Scanning a JSON file with this visits each string exactly once, in order
+JSON_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"')
 
 class apiError(Exception):
 	"""
@@ -17,50 +23,51 @@ class apiError(Exception):
 
 class Relationship:
 	"""Represents a relationship between SNAC constellations"""
+	__slots__ = ("source", "target", "type") # Keep big lists of these small
 
 	def __init__(self, source, target, type):
 		self.source = source
 		self.target = target
 		self.type = type
 
-	def getInverse(self):
-		inverseList = {
-			"almaMaterOf":"alumnusOrAlumnaOf",
-			"alumnusOrAlumnaOf":"almaMaterOf",
-			"ancestorOf":"descendantOf",
-			"auntOrUncleOf":"nieceOrNephewOf",
-			"child-in-law of":"parent-in-law of",
-			"childOf":"parentOf",
-			"conferredHonorsTo":"honoredBy",
-			"descendantOf":"ancestorOf",
-			"employeeOf":"employerOf",
-			"employerOf":"employeeOf",
-			"foundedBy":"founderOf",
-			"founderOf":"foundedBy",
-			"grandchildOf":"grandparentOf",
-			"grandparentOf":"grandchildOf",
-			"hasHonoraryMember":"honoraryMemberOf",
-			"hasMember":"memberOf",
-			"Hierarchical-child":"Hierarchical-parent",
-			"Hierarchical-parent":"Hierarchical-child",
-			"honoraryMemberOf":"hasHonoraryMember",
-			"honoredBy":"conferredHonorsTo",
-			"investigatedBy":"investigatorOf",
-			"investigatorOf":"investigatedBy",
-			"memberOf":"hasMember",
-			"nieceOrNephewOf":"auntOrUncleOf",
-			"ownedBy":"ownerOf",
-			"ownerOf":"ownedBy",
-			"parent-in-law of":"child-in-law of",
-			"parentOf":"childOf",
-			"predecessorOf":"successorOf",
-			"successorOf":"predecessorOf"
-		}
+	inverseList = {
+		"almaMaterOf":"alumnusOrAlumnaOf",
+		"alumnusOrAlumnaOf":"almaMaterOf",
+		"ancestorOf":"descendantOf",
+		"auntOrUncleOf":"nieceOrNephewOf",
+		"child-in-law of":"parent-in-law of",
+		"childOf":"parentOf",
+		"conferredHonorsTo":"honoredBy",
+		"descendantOf":"ancestorOf",
+		"employeeOf":"employerOf",
+		"employerOf":"employeeOf",
+		"foundedBy":"founderOf",
+		"founderOf":"foundedBy",
+		"grandchildOf":"grandparentOf",
+		"grandparentOf":"grandchildOf",
+		"hasHonoraryMember":"honoraryMemberOf",
+		"hasMember":"memberOf",
+		"Hierarchical-child":"Hierarchical-parent",
+		"Hierarchical-parent":"Hierarchical-child",
+		"honoraryMemberOf":"hasHonoraryMember",
+		"honoredBy":"conferredHonorsTo",
+		"investigatedBy":"investigatorOf",
+		"investigatorOf":"investigatedBy",
+		"memberOf":"hasMember",
+		"nieceOrNephewOf":"auntOrUncleOf",
+		"ownedBy":"ownerOf",
+		"ownerOf":"ownedBy",
+		"parent-in-law of":"child-in-law of",
+		"parentOf":"childOf",
+		"predecessorOf":"successorOf",
+		"successorOf":"predecessorOf"
+	}
 
+	def getInverse(self):
 		# Check if the relationship's type has an inverse
-		if self.type in inverseList:
+		if self.type in self.inverseList:
 			# Get the inverse type if there is one, and return the inverse rel
-			inverseType = inverseList[self.type]
+			inverseType = self.inverseList[self.type]
 			return Relationship(self.target, self.source, inverseType)
 		else:
 			return Relationship(self.target, self.source, self.type)
@@ -72,63 +79,67 @@ class Relationship:
 					return True
 		return False
 
+	def __hash__(self):
+		return hash((self.source, self.type, self.target))
+
 	def __str__(self):
 		return ", ".join([self.source, self.type, self.target])
 
+	typeIDList = {
+		"acquaintanceOf": "28227",
+		"almaMaterOf": "28229",
+		"alumnusOrAlumnaOf": "28230",
+		"ancestorOf": "28232",
+		"associatedWith": "28234",
+		"auntOrUncleOf": "28236",
+		"biologicalParentOf": "28237",
+		"child-in-law Of": "28238",
+		"child-in-law of": "28238",
+		"childOf": "28239",
+		"conferredHonorsTo": "28240",
+		"correspondedWith": "28243",
+		"createdBy": "28245",
+		"creatorOf": "28246",
+		"descendantOf": "28248",
+		"employeeOf": "28250",
+		"employerOf": "28251",
+		"foundedBy": "28253",
+		"founderOf": "28254",
+		"grandchildOf": "28255",
+		"grandparentOf": "28256",
+		"hasFamilyRelationTo": "400456",
+		"hasHonoraryMember": "28260",
+		"hasMember": "28261",
+		"Hierarchical-child": "28263",
+		"Hierarchical-parent": "28264",
+		"honoraryMemberOf": "28265",
+		"honoredBy": "28266",
+		"investigatedBy": "28267",
+		"investigatorOf": "28268",
+		"isSuccessorOf": "400459",
+		"leaderOf": "28269",
+		"memberOf": "28271",
+		"nieceOrNephewOf": "28272",
+		"ownedBy": "400478",
+		"ownerOf": "28274",
+		"parent-in-law Of": "28275",
+		"parent-in-law of": "28275",
+		"parentOf": "28276",
+		"participantIn": "28277",
+		"politicalOpponentOf": "28279",
+		"predecessorOf": "28280",
+		"relativeOf": "28281",
+		"sibling-in-law Of": "28282",
+		"sibling-in-law of": "28282",
+		"siblingOf": "28283",
+		"sibling of": "28283",
+		"spouseOf": "28284",
+		"subordinateOf": "28290",
+		"successorOf": "28291"
+	}
+
 	def getTypeId(self):
-		typeIDList = {
-			"acquaintanceOf": "28227",
-			"almaMaterOf": "28229",
-			"alumnusOrAlumnaOf": "28230",
-			"ancestorOf": "28232",
-			"associatedWith": "28234",
-			"auntOrUncleOf": "28236",
-			"biologicalParentOf": "28237",
-			"child-in-law Of": "28238",
-			"child-in-law of": "28238",
-			"childOf": "28239",
-			"conferredHonorsTo": "28240",
-			"correspondedWith": "28243",
-			"createdBy": "28245",
-			"creatorOf": "28246",
-			"descendantOf": "28248",
-			"employeeOf": "28250",
-			"employerOf": "28251",
-			"foundedBy": "28253",
-			"founderOf": "28254",
-			"grandchildOf": "28255",
-			"grandparentOf": "28256",
-			"hasFamilyRelationTo": "400456",
-			"hasHonoraryMember": "28260",
-			"hasMember": "28261",
-			"Hierarchical-child": "28263",
-			"Hierarchical-parent": "28264",
-			"honoraryMemberOf": "28265",
-			"honoredBy": "28266",
-			"investigatedBy": "28267",
-			"investigatorOf": "28268",
-			"isSuccessorOf": "400459",
-			"leaderOf": "28269",
-			"memberOf": "28271",
-			"nieceOrNephewOf": "28272",
-			"ownedBy": "400478",
-			"ownerOf": "28274",
-			"parent-in-law Of": "28275",
-			"parent-in-law of": "28275",
-			"parentOf": "28276",
-			"participantIn": "28277",
-			"politicalOpponentOf": "28279",
-			"predecessorOf": "28280",
-			"relativeOf": "28281",
-			"sibling-in-law Of": "28282",
-			"sibling-in-law of": "28282",
-			"siblingOf": "28283",
-			"sibling of": "28283",
-			"spouseOf": "28284",
-			"subordinateOf": "28290",
-			"successorOf": "28291"
-		}
-		return typeIDList[self.type]
+		return self.typeIDList[self.type]
 
 	typeUriList = {
 		"acquaintanceOf":"",
@@ -178,33 +189,154 @@ class Relationship:
 		"successorOf":""
 	}
 
+class RelationshipSet:
+	"""
+	A set of relationships, indexed by the pair of constellations they link
+
+	Membership checks are a dict & set lookup, so checking every relationship
+	in a list against the set takes linear rather than quadratic time.
 
-def loadSnacData():
+	Attributes:
+		byPair: dict of the form {(source, target): set of relationship types}
+		size: int, the number of distinct relationships in the set
 	"""
-	Read SNAC JSON data from files in the snac_jsons folder.
 
-	Returns: constellations, a list of SNAC JSONs in dict form
+	def __init__(self, relations=()):
+		self.byPair = {}
+		self.size = 0
+		for relation in relations:
+			self.add(relation)
+
+	def __len__(self):
+		return self.size
+
+	def __contains__(self, relation):
+		types = self.byPair.get((relation.source, relation.target))
+		return types is not None and relation.type in types
+
+	def __iter__(self):
+		for (source, target), types in self.byPair.items():
+			for type in types:
+				yield Relationship(source, target, type)
+
+	def add(self, relation):
+		"""Add a Relationship to the set (if it isn't already there)"""
+		# Interning means each ID & type is only stored once, however many
+		#	relationships mention it
+		pair = (intern(relation.source), intern(relation.target))
+		types = self.byPair.setdefault(pair, set())
+		if relation.type not in types:
+			types.add(intern(relation.type))
+			self.size += 1
+
+	def typesBetween(self, source, target):
+		"""Return the set of relationship types from source to target"""
+		return self.byPair.get((source, target), set())
+
+	def missingReciprocals(self, relations, skipTypes=("associatedWith",)):
+		"""
+		Find the inverses of a list of relationships that aren't in the set
+
+		@param: relations, an iterable of Relationship objects
+		@param: skipTypes, relationship types that don't need an inverse
+		@return: a list of Relationship objects, in the order of relations
+		"""
+		missing = []
+		for relation in relations:
+			if relation.type in skipTypes:
+				continue
+			inverse = relation.getInverse()
+			if inverse not in self:
+				missing.append(inverse)
+		return missing
+
+def countRelationshipTypes(relations):
+	"""Return a dict of the form {relationship type: # of relationships}"""
+	counts = {}
+	for relation in relations:
+		counts[relation.type] = counts.get(relation.type, 0) + 1
+	return counts
+
+def loadSnacData(processes=1, fields=None):
 	"""
-	# Get list of filenames to read
-	filenames = glob("snac_jsons/*.json")
+	Read SNAC JSON data from the files in the snac_jsons folder.
 
-	# Initialize array of constellations to eventually return
-	constellations = []
+	The data comes from the indexed SnacStore, which only re-reads the files
+	that have been added or changed since it was last synced.
 
-	# Loop over filenames, reading the files & adding the data to constellations
-	print("Reading {} JSON files...".format(len(filenames)))
-	for filename in filenames:
-		try:
-			print("Reading {}".format(filename + "..."), end="")
-			with open(filename) as f:
-				constellations.append(json.load(f))
-			print("\tdone",end="\r")
-		except Exception as e:
-			print("")
-			raise e
-	print("\nJSON files read successfully.\n")
+	Params: @processes, the number of processes to parse JSON with
+			@fields, a list of the top-level keys to include in each
+			constellation (e.g. ["id", "relations"]), or None for all of them
+	Returns: constellations, a list of SNAC JSONs in dict form, ordered by
+			 filename (whatever the number of processes)
+	"""
+	print("Syncing local constellation store...")
+	with SnacStore() as store:
+		counts = store.sync(processes)
+		msg = "{added} added, {updated} updated, {removed} removed."
+		print(msg.format(**counts))
+
+		print("Reading {} constellations...".format(len(store)))
+		constellations = list(store.iterConstellations(processes=processes,
+			fields=fields))
+
+	print("Constellations read successfully.\n")
 	return constellations
 
+def iterSnacData(entityType=None, hasField=None, processes=1, fields=None):
+	"""
+	Yield SNAC JSON data from the snac_jsons folder one constellation at a time.
+
+	Unlike loadSnacData, only the constellation currently being worked on is
+	held in memory.
+
+	Params: @entityType, only yield constellations of this type (e.g. "person")
+			@hasField, only yield constellations where this key is present and
+			non-empty (e.g. "subjects")
+			@processes, the number of processes to parse JSON with
+			@fields, a list of the top-level keys to include in each
+			constellation (e.g. ["ark", "genders"]), or None for all of them
+	Yields: SNAC JSONs in dict form, ordered by filename
+	"""
+	with openSnacStore(processes) as store:
+		yield from store.iterConstellations(entityType, hasField, processes,
+			fields)
+
+def openSnacStore(processes=1):
+	"""
+	Open the local constellation store, bringing it up to date with snac_jsons
+
+	Params: @processes, the number of processes to parse changed files with
+	Returns: a synced SnacStore (use it in a with statement to close it)
+	"""
+	store = SnacStore()
+	counts = store.sync(processes)
+	if sum(counts.values()) > 0:
+		msg = "Synced local constellation store: {added} added, "
+		msg += "{updated} updated, {removed} removed.\n"
+		print(msg.format(**counts))
+	return store
+
+def writeAtomically(filename, text):
+	"""
+	Write a string to a file so that readers never see a half-written file
+
+	The text goes to a temporary file in the same folder, which then replaces
+	the target in one step; if anything fails, the old file is left untouched.
+
+	@param: filename, str, the file to (over)write
+	@param: text, str, the contents to write
+	"""
+	directory = os.path.dirname(filename) or "."
+	fd, tempName = tempfile.mkstemp(dir=directory, suffix=".tmp")
+	try:
+		with os.fdopen(fd, "w", encoding="utf-8") as f:
+			f.write(text)
+		os.replace(tempName, filename)
+	except BaseException:
+		os.remove(tempName)
+		raise
+
 def loadRelationsFromFile(filename):
 	"""
 	Loads data from an external TSV & turns it into Relationship objects.
@@ -276,15 +408,17 @@ def loadIdsToUpdate():
 
 def postToApi(data, baseUrl):
 	"""
-	Make a POST call to a REST API and return the response
+	Make a PUT call to the SNAC REST API and return the response
+
+	Calls are made through the shared SnacClient for the server, so they reuse
+	open connections, time out, and are retried when SNAC throttles them.
 
 	@param: data, dict, JSON data to be passed in the call
 	@param: baseUrl, str, the URL of the API to call
 	@return the API response in dict form
 	"""
-	data = json.dumps(data) # Turn the dictionary into JSON
-	r = requests.put(baseUrl, data = data) # MAKE THE API REQUEST!!!!!
-	response = json.loads(r.text) # Turn the response from JSON into a dict
+	# MAKE THE API REQUEST!!!!! (over the server's shared, pooled connection)
+	response = getClient(baseUrl).call(data)
 	return response
 
 def verifyApiSuccess(response):